@@ -1,17 +1,44 @@
 import asyncio
+import weakref
 from datetime import datetime
 from inspect import Parameter
-from typing import List, Mapping, Optional
+from typing import Any, Dict, List, Mapping, Optional
 
 import discord
 from discord.ext import commands
 
-import helpers.fuzzle as fuzzle
+from helpers.fuzzle import FuzzleIndex
 
 MAINTAINER = "Dan6erbond#2259"
 
 
+class HelpIndex:
+
+    def __init__(self, version: Optional[int], max_suggestions: int = 256):
+        self.version = version
+        self.pages: List[Dict[str, Any]] = list()
+        self.cogs: Dict[str, Dict[str, Any]] = dict()
+        self.commands: Dict[str, Dict[str, Any]] = dict()
+        self.search: Optional[FuzzleIndex] = None
+
+        self.max_suggestions = max_suggestions
+        self.suggestions: Dict[str, str] = dict()
+
+    @staticmethod
+    def render(data: Dict[str, Any]) -> discord.Embed:
+        embed = discord.Embed.from_dict(data)
+        embed.timestamp = datetime.utcnow()
+        return embed
+
+    def add_suggestion(self, string: str, message: str):
+        if len(self.suggestions) >= self.max_suggestions:
+            del self.suggestions[next(iter(self.suggestions))]
+        self.suggestions[string] = message
+
+
 class HelpCommand(commands.HelpCommand):
+    # discord.py copies the help command for every invocation, so the indexes are kept per bot.
+    _indexes: 'weakref.WeakKeyDictionary[commands.Bot, HelpIndex]' = weakref.WeakKeyDictionary()
 
     def __init__(self, embed_color: discord.Colour = discord.Colour(0).from_rgb(64, 153, 130), **options):
         self._embed_color = embed_color
@@ -37,7 +64,19 @@ class HelpCommand(commands.HelpCommand):
                   v in cmd.clean_params.items()]
         return f"{self.context.bot.command_prefix}{cmd.name} {' '.join(params)}"
 
-    async def send_bot_help(self, mapping: Mapping[Optional[commands.Cog], List[commands.Command]]):
+    def get_index(self) -> HelpIndex:
+        bot = self.context.bot
+        # Bots that don't count their command changes get a fresh index every time.
+        version = getattr(bot, "commands_version", None)
+        index = self._indexes.get(bot)
+        if index is None or version is None or index.version != version:
+            index = self._indexes[bot] = self.build_index(version)
+        return index
+
+    def build_index(self, version: Optional[int]) -> HelpIndex:
+        help_index = HelpIndex(version)
+        mapping = self.get_bot_mapping()
+
         embeds = []
 
         for cog in mapping:
@@ -60,6 +99,37 @@ class HelpCommand(commands.HelpCommand):
         for index, embed in enumerate(embeds, start=1):
             embed.set_footer(text=f"Page {index} of {len(embeds)}", icon_url=self.context.bot.user.avatar_url)
 
+        help_index.pages = [embed.to_dict() for embed in embeds]
+
+        for cog in self.context.bot.cogs.values():
+            embed = self.embed
+            embed.set_author(name=f"Commands in the {cog.qualified_name} Category")
+            embed.description = "Use `!help [command]` for more information."
+
+            for cmd in cog.get_commands():
+                embed.add_field(name=f"`{self.get_cmd_string(cmd)}`",
+                                value=cmd.brief if cmd.brief else cmd.help,
+                                inline=False)
+
+            help_index.cogs[cog.qualified_name] = embed.to_dict()
+
+        for cmd in self.context.bot.walk_commands():
+            embed = self.embed
+
+            embed.add_field(name=f"`{self.get_cmd_string(cmd)}`",
+                            value=cmd.help if cmd.help else cmd.brief,
+                            inline=False)
+
+            help_index.commands[cmd.qualified_name] = embed.to_dict()
+
+        help_index.search = FuzzleIndex([{"key": cmd.name, "tags": cmd.aliases, "cmd": cmd}
+                                         for cmd in self.context.bot.commands])
+
+        return help_index
+
+    async def send_bot_help(self, mapping: Mapping[Optional[commands.Cog], List[commands.Command]]):
+        embeds = [HelpIndex.render(page) for page in self.get_index().pages]
+
         if not embeds:
             return
 
@@ -98,15 +168,7 @@ class HelpCommand(commands.HelpCommand):
                 seconds += (datetime.now() - time_started).seconds
 
     async def send_cog_help(self, cog: commands.Cog):
-        embed = self.embed
-        embed.set_author(name=f"Commands in the {cog.qualified_name} Category")
-        embed.description = "Use `!help [command]` for more information."
-
-        for cmd in cog.get_commands():
-            embed.add_field(name=f"`{self.get_cmd_string(cmd)}`",
-                            value=cmd.brief if cmd.brief else cmd.help,
-                            inline=False)
-
+        embed = HelpIndex.render(self.get_index().cogs[cog.qualified_name])
         await self.get_destination().send(embed=embed)
 
     async def send_group_help(self, group):
@@ -114,25 +176,29 @@ class HelpCommand(commands.HelpCommand):
         return await super().send_group_help(group)
 
     async def send_command_help(self, command: commands.Command):
-        embed = self.embed
-
-        embed.add_field(name=f"`{self.get_cmd_string(command)}`",
-                        value=command.help if command.help else command.brief,
-                        inline=False)
-
+        embed = HelpIndex.render(self.get_index().commands[command.qualified_name])
         await self.get_destination().send(embed=embed)
 
-    async def command_not_found(self, string):
-        cmds = [{"key": cmd.name, "tags": cmd.aliases, "cmd": cmd} for cmd in self.context.bot.commands]
+    def get_suggestion(self, string: str) -> str:
+        index = self.get_index()
+        message = index.suggestions.get(string)
+        if message is not None:
+            return message
 
-        results = fuzzle.find(cmds, string, 0.02)
+        results = index.search.find(string, return_all=True)
         if results:
-            top_cmds = '\n'.join([f"`{self.get_cmd_string(cmd['cmd'])}`" for cmd in results][:3])
-            await self.get_destination().send(f"No command called \"{string}\" found. " +
-                                              f"Maybe you meant?\n\n{top_cmds}\n\n" +
-                                              "Powered by Fuzzle™.")
+            top_cmds = '\n'.join([f"`{self.get_cmd_string(result.option['cmd'])}`" for result in results][:3])
+            message = f"No command called \"{string}\" found. " + \
+                f"Maybe you meant?\n\n{top_cmds}\n\n" + \
+                "Powered by Fuzzle™."
         else:
-            await self.get_destination().send(f"No command called \"{string}\" found. Please try a different search.")
+            message = f"No command called \"{string}\" found. Please try a different search."
+
+        index.add_suggestion(string, message)
+        return message
+
+    async def command_not_found(self, string):
+        await self.get_destination().send(self.get_suggestion(string))
 
     async def subcommand_not_found(self, command, string):
         print("Subcommand not found:", command, string)
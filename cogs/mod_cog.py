@@ -1,15 +1,20 @@
+import asyncio
 import time
 from datetime import datetime, timedelta
 from typing import TYPE_CHECKING
 
 import discord
 from discord import Embed
-from apraw.utils import BoundedSet
 from discord.ext import commands, tasks
 from discord.utils import escape_markdown
 
 from banhammer.models import RedditItem
 
+from config import config as lc_config
+from helpers.action_stats import WINDOWS
+from helpers.inbox_cursor import InboxCursor
+from helpers.metrics import metrics, read_summary
+
 if TYPE_CHECKING:
     from ..lester import LesterCrest
 
@@ -18,15 +23,20 @@ class ModCog(commands.Cog):
     def __init__(self, bot: 'LesterCrest'):
         self.bot = bot
         self.stats_updated = None
+        self._leaderboard = None
+        self._stats_message = None
+        self._inbox_cursor = InboxCursor(lc_config.get("inbox_cursor_file", "inbox_cursor.json"))
+
         self.update_stats.start()
         self.check_inbox.start()
-
-        self._msg_ids = BoundedSet(301)
-        self._skip_msgs = True
+        self.checkpoint_stats.start()
+        self.write_metrics.start()
 
     def cog_unload(self):
         self.update_stats.cancel()
         self.check_inbox.cancel()
+        self.checkpoint_stats.cancel()
+        self.write_metrics.cancel()
 
     @commands.command(help="Reload all the reactions for the subreddit configured and create a new info embed.")
     async def reload(self, ctx: commands.Context):
@@ -34,72 +44,221 @@ class ModCog(commands.Cog):
 
         channel = self.bot.get_channel(734713971428425729)
         message = await channel.fetch_message(736613065889546321)
+        await asyncio.gather(*(sub.load_reactions() for sub in self.bot.subreddits))
         for sub in self.bot.subreddits:
-            await sub.load_reactions()
             embed = await sub.get_reactions_embed(embed_template=self.bot.embed)
             await message.edit(embed=embed)
         await ctx.send("Reloaded all subreddit reactions!", delete_after=3)
 
+    @commands.command(help="Rebuild the dirty word list, optionally for other languages, and swap it in.")
+    @commands.has_role(734714209342062602)
+    async def reloadwords(self, ctx: commands.Context, *languages: str):
+        if self.bot.role == "gateway":
+            # The ingest process only reloads when the word list changes, languages can't be passed on to it.
+            if languages:
+                await ctx.send("❌ Comments are scanned by the ingest process, its languages are set with "
+                               "word_languages in the config.")
+                return
+            interval = lc_config.get("word_list_check_interval", 60.0)
+            await ctx.send(f"Comments are scanned by the ingest process, it picks up word list changes within "
+                           f"{interval:.0f}s.")
+            return
+
+        start = time.perf_counter()
+        try:
+            matcher, key = await self.bot.reload_word_matcher(languages)
+        except Exception as e:
+            print(f"Error reloading word list: {e}")
+            await ctx.send(f"❌ Couldn't reload the word list: {e}")
+            return
+        await ctx.send(f"Swapped in {len(matcher)} words ({', '.join(self.bot.word_languages)}, {key}) in "
+                       f"{(time.perf_counter() - start) * 1000:.0f}ms.")
+
+    @commands.command(help="Show handler latencies, error rates and queue stats.")
+    @commands.has_role(734714209342062602)
+    async def perf(self, ctx: commands.Context):
+        spans = metrics.snapshot()
+        counters = dict(metrics.counters)
+        scanner = self.bot.word_scanner.stats()
+        note = ""
+
+        # In split mode the handlers, reports and word scanner run in the ingest process, which exports its metrics.
+        if self.bot.role == "gateway":
+            ingest = read_summary(self.bot.role_path(lc_config.get("metrics_summary_file", "metrics.json"), "ingest"))
+            if ingest:
+                spans.update({f"ingest:{name}": span for name, span in ingest["spans"].items()})
+                counters.update({f"ingest:{name}": value for name, value in ingest["counters"].items()})
+                scanner.update({name[len("word_scanner."):]: value for name, value in ingest["gauges"].items()
+                                if name.startswith("word_scanner.")})
+                scanner["mode"] = f"{scanner['mode']} (ingest)"
+                note = f" Ingest metrics from {time.time() - ingest['created']:.0f}s ago."
+            else:
+                note = " No metrics from the ingest process yet."
+
+        lines = [f"{'span':<26}{'n':>7}{'p50':>8}{'p95':>8}{'p99':>8}{'err':>6}"]
+        for name, span in spans.items():
+            lines.append(f"{name[:25]:<26}{span['count']:>7}{span['p50'] * 1000:>8.1f}{span['p95'] * 1000:>8.1f}"
+                         f"{span['p99'] * 1000:>8.1f}{span['error_rate']:>6.1%}")
+
+        embed = self.bot.embed.set_author(name="Performance")
+        embed.description = f"Latencies in ms.{note}\n```\n" + "\n".join(lines)[:1850] + "\n```"
+
+        persistence = self.bot.persistence.stats()
+        embed.add_field(name="Persistence",
+                        value=f"Queue: {persistence['queue_depth']}\nSpooled: {persistence['spooled']}\n"
+                              f"Retries: {persistence['retries']}\n"
+                              f"Flush: {persistence['avg_flush_latency'] * 1000:.1f}ms avg")
+
+        cache = self.bot.item_cache.stats()
+        embed.add_field(name="Item Cache", value=f"Size: {cache['size']}\nHit rate: {cache['hit_rate']:.1%}")
+
+        reddit_cache = self.bot.reddit_cache.stats()
+        embed.add_field(name="Reddit Cache",
+                        value=f"Size: {reddit_cache['size']}\nHit rate: {reddit_cache['hit_rate']:.1%}\n"
+                              f"Coalesced: {reddit_cache['coalesced']}")
+
+        embed.add_field(name="Word Scanner",
+                        value=f"Mode: {scanner['mode']}\nWords: {scanner['words']:.0f} ({self.bot.word_list_key})\n"
+                              f"Queue: {scanner['queue_depth']}\n"
+                              f"Batch: {scanner['avg_batch_size']:.1f} avg\n"
+                              f"Throughput: {scanner['throughput']:.0f}/s")
+
+        channels = [f"{escape_markdown(name)}: {queue['pending']} pending, {queue['max_lag']:.1f}s max lag"
+                    for name, queue in self.bot.dispatcher.stats().items()]
+        embed.add_field(name="Dispatcher", value="\n".join(channels)[:1024] or "Idle", inline=False)
+
+        events = [f"{name}: {value}" for name, value in sorted(counters.items())]
+        if events:
+            embed.add_field(name="Events", value="\n".join(events)[:1024], inline=False)
+
+        await ctx.send(embed=embed)
+
+    @tasks.loop(seconds=60.0)
+    async def write_metrics(self):
+        await self.bot.wait_until_ready()
+        self.bot.collect_metrics()
+        metrics.write_prometheus(self.bot.role_path(lc_config.get("metrics_file", "metrics.prom")))
+
+    @write_metrics.error
+    async def handle_metrics_error(self, error):
+        print(f"Error in write_metrics: {error}")
+
     @tasks.loop(seconds=5 * 60.0)
+    @metrics.timed("update_stats")
     async def update_stats(self):
         await self.bot.wait_until_ready()
 
-        if not self.bot.stats_updated:
+        action_stats = self.bot.action_stats
+        if not action_stats.advance() and not self.bot.stats_updated:
             return
 
         self.bot.stats_updated = False
 
-        channel = self.bot.get_channel(734713971428425729)
-        message = await channel.fetch_message(738713709869793291)
+        size = lc_config.get("leaderboard_size", 10)
+        leaderboard = tuple((t, window, tuple(action_stats.top(t, window, size)))
+                            for t in action_stats.TYPES for window in WINDOWS)
+
+        # Only the top of each board is shown, so changes further down don't need an edit.
+        if leaderboard == self._leaderboard:
+            return
 
         embed = self.bot.embed.set_author(name="Actions by Moderators")
 
-        start_time = time.time()
-        for t, users in self.bot.action_stats.items():
-            user_stats = {k: v for k, v in sorted(users.items(), key=lambda item: item[1], reverse=True)}
-            lines = [f"{escape_markdown(user)}: {actions}" for user, actions in user_stats.items()]
+        for t, window, users in leaderboard:
+            lines = [f"{escape_markdown(user)}: {actions}" for user, actions in users]
 
             if any(line for line in lines):
-                embed.add_field(name=t.title(), value="\n".join(lines))
+                embed.add_field(name=f"{t.title()} ({window})", value="\n".join(lines))
 
-        await message.edit(embed=embed)
+        if not self._stats_message:
+            channel = self.bot.get_channel(734713971428425729)
+            self._stats_message = await channel.fetch_message(738713709869793291)
+
+        try:
+            await self._stats_message.edit(embed=embed)
+        except discord.NotFound:
+            self._stats_message = None
+            raise
+
+        self._leaderboard = leaderboard
 
     @update_stats.error
     async def handle_stats_error(self, error):
         print(f"Error in update_stats: {error}")
 
+    @tasks.loop(seconds=15 * 60.0)
+    @metrics.timed("checkpoint_stats")
+    async def checkpoint_stats(self):
+        await self.bot.wait_until_ready()
+        self.bot.save_stats_checkpoint()
+
     @tasks.loop(seconds=5 * 60.0)
+    @metrics.timed("check_inbox")
     async def check_inbox(self):
         await self.bot.wait_until_ready()
 
         channel = self.bot.get_channel(740496959311446056)
 
         user = await self.bot.reddit.user.me()
-        msgs = [msg async for msg in user.inbox() if msg.id not in self._msg_ids]
-
-        for msg in reversed(msgs):
-            self._msg_ids.add(msg.id)
-            
-            if self._skip_msgs:
-                continue
-
-            if msg.was_comment:
-                comment = await self.bot.reddit.comment(msg.id)
-                item = RedditItem(comment, self.bot.subreddits[0], "new")
-                embed = await item.get_embed(embed_template=self.bot.embed)
+
+        msgs = list()
+        async for msg in user.inbox():
+            if self._inbox_cursor.initialized and self._inbox_cursor.is_older(msg):
+                break
+            if not self._inbox_cursor.initialized or self._inbox_cursor.is_new(msg):
+                msgs.append(msg)
+
+        msgs.reverse()
+
+        if not self._inbox_cursor.initialized:
+            self._inbox_cursor.advance(msgs)
+            return
+
+        self._adapt_inbox_interval(len(msgs))
+
+        semaphore = asyncio.Semaphore(lc_config.get("inbox_concurrency", 4))
+
+        async def hydrate(msg):
+            async with semaphore:
+                return await self._hydrate_inbox_message(msg)
+
+        results = await asyncio.gather(*(hydrate(msg) for msg in msgs), return_exceptions=True)
+
+        for msg, result in zip(msgs, results):
+            if isinstance(result, Exception):
+                print(f"Error hydrating inbox message {msg.id}: {result}")
             else:
-                author = await msg.author()
-                embed = self.bot.embed.set_author(
-                    name=f"Message by /u/{msg._data['author']}",
-                    url=author._data.get("icon_img", "") or Embed.Empty)
-                embed.description = msg.body
-                embed.timestamp = msg.created_utc
-
-            message = await channel.send(embed=embed)
-            if msg.was_comment:
-                await item.add_reactions(message)
-
-        self._skip_msgs = False
+                embed, item = result
+                message = await channel.send(embed=embed)
+                if item:
+                    self.bot.item_cache.put(message, item)
+                    self.bot.reaction_attacher.attach(message, [r.emoji for r in item.reactions])
+
+            self._inbox_cursor.advance([msg])
+
+    async def _hydrate_inbox_message(self, msg):
+        if msg.was_comment:
+            comment = await self.bot.reddit.comment(msg.id)
+            item = RedditItem(comment, self.bot.subreddits[0], "new")
+            return await item.get_embed(embed_template=self.bot.embed), item
+
+        author = await msg.author()
+        embed = self.bot.embed.set_author(
+            name=f"Message by /u/{msg._data['author']}",
+            url=author._data.get("icon_img", "") or Embed.Empty)
+        embed.description = msg.body
+        embed.timestamp = msg.created_utc
+        return embed, None
+
+    def _adapt_inbox_interval(self, found: int):
+        # Poll faster while mail keeps arriving and back off while the inbox is quiet.
+        min_interval = lc_config.get("inbox_min_interval", 60.0)
+        max_interval = lc_config.get("inbox_max_interval", 15 * 60.0)
+        interval = self.check_inbox.seconds
+
+        interval = max(min_interval, interval / 2) if found else min(max_interval, interval * 1.5)
+        if interval != self.check_inbox.seconds:
+            self.check_inbox.change_interval(seconds=interval)
 
     @check_inbox.error
     async def handle_stats_error(self, error):
@@ -1,7 +1,28 @@
+import argparse
 import json
+import math
+import random
 import re
+import statistics
+import sys
 import time
-import praw
+import tracemalloc
+from typing import Callable, Dict, List
+
+from helpers.word_matcher import WordMatcher, build_artifact, word_list_path
+
+# Vocabulary and near misses used to build comments that look like the ones posted to /r/gtaonline.
+VOCABULARY = """
+the a to and i you it is of that in for on this with but just have my be if so not are was can get do
+at or all your they what like one time out money mission heist cayo perico casino diamond griefer
+oppressor mk2 session lobby rockstar update dlc grind payout rp cooldown nightclub bunker mc business
+supplies sell buy car vehicle garage apartment office ceo vip bounty kosatka submarine sub bug glitch
+patch weekly bonus double triple lester crest freemode friend crew solo public invite only private
+server ban report modded hacker players everyone game playing played played today yesterday week
+""".split()
+
+NEAR_MISSES = ["class", "assassin", "hello", "shell", "passenger", "scunthorpe", "cocktail", "therapist",
+               "analysis", "cockpit", "titan", "spunky", "hellcat", "dickens", "sextant", "grassland"]
 
 
 def write_words():
@@ -16,23 +37,149 @@ def write_words():
         f.write("\n".join(ws))
 
 
+def load_words(languages: List[str]) -> List[str]:
+    if languages == ["en"]:
+        with open("assets/DirtyWords_en.txt", encoding="utf8") as f:
+            return f.read().splitlines()
+    with open("assets/DirtyWords.json", encoding="utf8") as f:
+        return [r["word"] for r in json.load(f)["RECORDS"] if r["language"] in languages]
+
+
+def build_corpus(words: List[str], size: int = 20000, hit_rate: float = 0.04, seed: int = 0,
+                 median_length: int = 90, max_length: int = 1024) -> List[str]:
+    rnd = random.Random(seed)
+    corpus = list()
+
+    for _ in range(size):
+        length = min(max_length, max(2, int(rnd.lognormvariate(math.log(median_length), 1.0))))
+        tokens = list()
+        while sum(len(t) + 1 for t in tokens) < length:
+            tokens.append(rnd.choice(NEAR_MISSES) if rnd.random() < 0.02 else rnd.choice(VOCABULARY))
+
+        if rnd.random() < hit_rate:
+            tokens.insert(rnd.randrange(len(tokens) + 1), rnd.choice(words))
+
+        text = " ".join(tokens)
+        if rnd.random() < 0.1:
+            text = text.capitalize() + rnd.choice(".!?")
+        corpus.append(text[:max_length - 3] + (text[max_length - 3:] and "..."))
+
+    return corpus
+
+
+def patterns_implementation(words: List[str]) -> Callable[[str], bool]:
+    word_patterns = [re.compile(r'\b({0})\b'.format(w), flags=re.IGNORECASE) for w in words]
+    return lambda text: any(pattern.search(text) for pattern in word_patterns)
+
+
+def matcher_implementation(words: List[str]) -> Callable[[str], bool]:
+    matcher = WordMatcher(words)
+    return lambda text: matcher.search(text) is not None
+
+
+# The first implementation is the reference every other one has to agree with.
+IMPLEMENTATIONS: Dict[str, Callable[[List[str]], Callable[[str], bool]]] = {
+    "patterns": patterns_implementation,
+    "matcher": matcher_implementation,
+}
+
+
+def percentile(values: List[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def benchmark(name: str, words: List[str], corpus: List[str]) -> Dict:
+    factory = IMPLEMENTATIONS[name]
+
+    start = time.perf_counter()
+    scan = factory(words)
+    build_time = time.perf_counter() - start
+
+    latencies = list()
+    matches = list()
+    for index, text in enumerate(corpus):
+        start = time.perf_counter_ns()
+        matched = scan(text)
+        latencies.append(time.perf_counter_ns() - start)
+        if matched:
+            matches.append(index)
+
+    total = sum(latencies) / 1e9
+    size = sum(len(text.encode("utf8")) for text in corpus)
+
+    # Memory is measured in a separate pass since tracemalloc slows down the timed one.
+    re.purge()
+    tracemalloc.start()
+    scan = factory(words)
+    for text in corpus:
+        scan(text)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        "implementation": name,
+        "build_ms": build_time * 1000,
+        "comments_per_sec": len(corpus) / total if total else 0.0,
+        "mb_per_sec": size / 1e6 / total if total else 0.0,
+        "p50_us": percentile(latencies, 50) / 1000,
+        "p99_us": percentile(latencies, 99) / 1000,
+        "mean_us": statistics.mean(latencies) / 1000,
+        "peak_kb": peak / 1024,
+        "matches": matches,
+    }
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Offline benchmark of the dirty word filters.")
+    parser.add_argument("--comments", type=int, default=20000, help="Number of synthetic comments.")
+    parser.add_argument("--hit-rate", type=float, default=0.04, help="Share of comments containing a word.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the synthetic corpus.")
+    parser.add_argument("--languages", nargs="+", default=["en"], help="Languages to load from the word list.")
+    parser.add_argument("--implementations", nargs="+", default=list(IMPLEMENTATIONS),
+                        choices=list(IMPLEMENTATIONS), help="Implementations to benchmark.")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+    parser.add_argument("--build", action="store_true",
+                        help="Compile the word list for --languages into the artifact the bot loads, then exit.")
+    parser.add_argument("--artifacts", default="assets/compiled", help="Directory the artifacts are written to.")
+    args = parser.parse_args(argv)
+
+    if args.build:
+        start = time.perf_counter()
+        matcher, key = build_artifact(word_list_path(args.languages), args.languages, args.artifacts)
+        print(f"Built {len(matcher)} words for {', '.join(args.languages)} into {args.artifacts}/words-{key}.json "
+              f"in {(time.perf_counter() - start) * 1000:.0f}ms.")
+        return 0
+
+    words = load_words(args.languages)
+    corpus = build_corpus(words, args.comments, args.hit_rate, args.seed)
+    results = [benchmark(name, words, corpus) for name in args.implementations]
+
+    reference = set(results[0]["matches"])
+    disagreements = {r["implementation"]: sorted(set(r["matches"]) ^ reference)[:10]
+                     for r in results[1:] if set(r["matches"]) != reference}
+
+    if args.json:
+        print(json.dumps({
+            "comments": len(corpus),
+            "words": len(words),
+            "seed": args.seed,
+            "results": [{k: v for k, v in r.items() if k != "matches"} for r in results],
+            "disagreements": disagreements
+        }, indent=2))
+    else:
+        print(f"{len(corpus)} comments, {len(words)} words, seed {args.seed}.")
+        print(f"{'implementation':<16}{'build ms':>10}{'comments/s':>12}{'MB/s':>8}{'p50 us':>9}{'p99 us':>9}"
+              f"{'peak KB':>10}{'matches':>9}")
+        for r in results:
+            print(f"{r['implementation']:<16}{r['build_ms']:>10.1f}{r['comments_per_sec']:>12.0f}"
+                  f"{r['mb_per_sec']:>8.2f}{r['p50_us']:>9.1f}{r['p99_us']:>9.1f}{r['peak_kb']:>10.0f}"
+                  f"{len(r['matches']):>9}")
+        for name, indices in disagreements.items():
+            print(f"{name} disagrees with {results[0]['implementation']} on comments {indices}.")
+
+    return 1 if disagreements else 0
+
+
 if __name__ == "__main__":
-    with open("assets/DirtyWords_en.txt") as f:
-        words = f.read().splitlines()
-        word_patterns = [re.compile(r'\b({0})\b'.format(w), flags=re.IGNORECASE) for w in words]
-
-        reddit = praw.Reddit("LCB")
-        texts = [comment.body for comment in reddit.subreddit("gtaonline").comments(limit=None)]
-        print(f"{len(texts)} comments found.")
-
-        start_time = time.time()
-        matches = 0
-        for text in texts:
-            matches += 1 if any(f" {word} " in f" {text} " for word in words) else 0
-        print(f"{matches} matches, took {time.time() - start_time} seconds.")
-
-        start_time = time.time()
-        matches = 0
-        for text in texts:
-            matches += 1 if any(pattern.search(text) for pattern in word_patterns) else 0
-        print(f"{matches} matches, took {time.time() - start_time} seconds.")
+    sys.exit(main())
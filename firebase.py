@@ -1,18 +1,150 @@
+import argparse
+import itertools
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterable, Iterator, List
+
 import firebase_admin
 from firebase_admin import credentials, firestore
 
+from helpers.action_log import action_id
+from helpers.persistence import MAX_BATCH_SIZE
 from stats import *
 
-cred = credentials.Certificate("gtaonline-cf0ea-firebase-adminsdk-m40wm-c97b6484bf.json")
-app = firebase_admin.initialize_app(cred)
-db = firestore.client()
+
+def create_client():
+    if os.environ.get("FIRESTORE_EMULATOR_HOST"):
+        # The emulator doesn't check credentials, so there's no need for the service account.
+        from google.cloud import firestore as cloud_firestore
+        return cloud_firestore.Client(project=os.environ.get("GCLOUD_PROJECT", "gtaonline-cf0ea"))
+
+    cred = credentials.Certificate("gtaonline-cf0ea-firebase-adminsdk-m40wm-c97b6484bf.json")
+    firebase_admin.initialize_app(cred)
+    return firestore.client()
+
+
+_db = None
+_db_lock = threading.Lock()
+
+
+def get_db():
+    # Connecting reads the credentials and sets up the client, so it's only done once something needs it.
+    global _db
+    with _db_lock:
+        if _db is None:
+            _db = create_client()
+    return _db
+
+
+def __getattr__(name: str):
+    if name == "db":
+        return get_db()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def load_checkpoint(path: str) -> int:
+    try:
+        with open(path, encoding="utf8") as f:
+            return json.load(f)["position"]
+    except FileNotFoundError:
+        return 0
+    except (ValueError, KeyError) as e:
+        print(f"Ignoring invalid backfill checkpoint {path}: {e}")
+        return 0
+
+
+def save_checkpoint(path: str, position: int):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf8") as f:
+        json.dump({"position": position}, f)
+    os.replace(tmp_path, path)
+
+
+def get_backfill_payloads(position: int = 0) -> Iterator[Dict[str, Any]]:
+    action_log = get_action_log()
+    if action_log.exists():
+        yield from action_log.payloads(since=position)
+    else:
+        yield from itertools.islice(get_payloads(), position, None)
+
+
+def commit_batch(client: Any, collection: str, payloads: List[Dict[str, Any]], max_retries: int = 4,
+                 backoff: float = 0.5) -> int:
+    for attempt in range(max_retries + 1):
+        try:
+            batch = client.batch()
+            for payload in payloads:
+                batch.set(client.collection(collection).document(action_id(payload)), payload)
+            batch.commit()
+            return len(payloads)
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+            print(f"Error committing backfill batch (attempt {attempt + 1}/{max_retries + 1}): {e}")
+            time.sleep(backoff * 2 ** attempt)
+
+
+def backfill(client: Any, payloads: Iterable[Dict[str, Any]], collection: str = "mod_actions",
+             batch_size: int = MAX_BATCH_SIZE, parallel: int = 4, position: int = 0,
+             checkpoint_path: str = None, report_interval: float = 5.0) -> int:
+    payloads = iter(payloads)
+    batches = iter(lambda: list(itertools.islice(payloads, min(batch_size, MAX_BATCH_SIZE))), [])
+
+    started = last_report = time.monotonic()
+    submitted = committed = position
+    pending = dict()
+    finished = dict()
+
+    def collect():
+        nonlocal committed, last_report
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            finished[pending.pop(future)] = future.result()
+
+        # Batches finish out of order, so the checkpoint only moves past batches with nothing pending before them.
+        while committed in finished:
+            committed += finished.pop(committed)
+        if checkpoint_path:
+            save_checkpoint(checkpoint_path, committed)
+
+        now = time.monotonic()
+        if now - last_report >= report_interval:
+            last_report = now
+            written = committed - position
+            print(f"{written} mod actions written ({written / (now - started):.0f} docs/s)")
+
+    with ThreadPoolExecutor(parallel) as executor:
+        for batch in batches:
+            pending[executor.submit(commit_batch, client, collection, batch)] = submitted
+            submitted += len(batch)
+            if len(pending) >= 2 * parallel:
+                collect()
+        while pending:
+            collect()
+
+    written = committed - position
+    elapsed = time.monotonic() - started
+    print(f"{written} mod actions written in {elapsed:.1f}s ({written / elapsed if elapsed else 0:.0f} docs/s)")
+    return written
+
 
 if __name__ == "__main__":
-    mod_actions = db.collection("mod_actions")
+    parser = argparse.ArgumentParser(description="Backfill the mod actions into Firestore.")
+    parser.add_argument("--collection", default="mod_actions")
+    parser.add_argument("--batch-size", type=int, default=MAX_BATCH_SIZE)
+    parser.add_argument("--parallel", type=int, default=4, help="Number of batches to commit at the same time.")
+    parser.add_argument("--checkpoint", default="backfill.checkpoint", help="File recording the backfill's progress.")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start from the beginning.")
+    args = parser.parse_args()
+
+    start_position = 0 if args.restart else load_checkpoint(args.checkpoint)
+    if start_position:
+        print(f"Resuming backfill from mod action {start_position}.")
 
-    count = 0
-    for payload in get_payloads():
-        mod_actions.add(payload)
-        count += 1
+    count = backfill(get_db(), get_backfill_payloads(start_position), args.collection, args.batch_size, args.parallel,
+                     start_position, args.checkpoint)
 
     print(count, "mod actions added to Firestore.")
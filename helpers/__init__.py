@@ -1 +1,10 @@
-from .message_builder import MessageBuilder
+from .word_matcher import WordMatch, WordMatcher
+
+
+def __getattr__(name: str):
+    # MessageBuilder needs discord and Banhammer, so it's only imported when used and tools that just match words,
+    # like the dirty words benchmark, run without the bot's dependencies.
+    if name == "MessageBuilder":
+        from .message_builder import MessageBuilder
+        return MessageBuilder
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
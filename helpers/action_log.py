@@ -0,0 +1,528 @@
+import hashlib
+import json
+import mmap
+import os
+import pickle
+import re
+import shutil
+import struct
+import sys
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from itertools import groupby
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+POST_URL_PATTERN = re.compile(
+    r"/r(?:/(?P<subreddit>\w+))/comments(?:/(?P<submission>\w+))(?:/\w+/(?P<comment>\w+))?")
+
+ITEM_TYPES = ("", "submission", "comment", "modmail", "mod action")
+
+ACTION_KINDS = ("dismissed", "approved", "removed", "locked", "unlocked", "flaired", "marked NSFW", "replied to",
+                "banned", "archived", "muted", "other")
+
+# Index schema versions, each with its file extension and entry layout:
+#   1: offset, length, timestamp, moderator id, item type
+#   2: the same, followed by the subreddit id and a bitmask of ACTION_KINDS
+INDEX_FORMATS = {
+    1: ("idx", struct.Struct("<QIdIB")),
+    2: ("idx2", struct.Struct("<QIdIBIH"))
+}
+INDEX_VERSION = 2
+INDEX_ENTRY = INDEX_FORMATS[INDEX_VERSION][1]
+RECORD_HEADER = struct.Struct("<I")
+
+
+class IndexEntry(NamedTuple):
+    position: int
+    timestamp: float
+    moderator: str
+    item_type: str
+    segment: str
+    offset: int
+    length: int
+    subreddit: str = ""
+    actions: int = 0
+
+
+def get_item_type(payload: Dict[str, Any]) -> str:
+    item = payload.get("item")
+    if isinstance(item, str):
+        match = POST_URL_PATTERN.search(item)
+        if match and match.group("comment"):
+            return "comment"
+        elif match:
+            return "submission"
+        return ""
+    elif isinstance(item, dict):
+        return item.get("type", "") if item.get("type", "") in ITEM_TYPES else ""
+    return ""
+
+
+def get_subreddit(payload: Dict[str, Any]) -> str:
+    item = payload.get("item")
+    url = item if isinstance(item, str) else item.get("url", "") if isinstance(item, dict) else ""
+    match = POST_URL_PATTERN.search(url or "")
+    return match.group("subreddit") if match else ""
+
+
+def get_action_kinds(payload: Dict[str, Any]) -> List[str]:
+    # Ban actions name the user and duration, so they're collapsed into a single kind.
+    kinds = ["banned" if "banned" in action else action if action in ACTION_KINDS else "other"
+             for action in payload.get("actions") or []]
+    return list(dict.fromkeys(kinds)) or ["dismissed"]
+
+
+def get_action_mask(payload: Dict[str, Any]) -> int:
+    mask = 0
+    for kind in get_action_kinds(payload):
+        mask |= 1 << ACTION_KINDS.index(kind)
+    return mask
+
+
+def action_kinds(mask: int) -> List[str]:
+    return [kind for i, kind in enumerate(ACTION_KINDS) if mask >> i & 1]
+
+
+def get_timestamp(payload: Dict[str, Any]) -> float:
+    performed = payload.get("performed_utc")
+    if isinstance(performed, datetime):
+        return (performed if performed.tzinfo else performed.replace(tzinfo=timezone.utc)).timestamp()
+    elif isinstance(performed, (int, float)):
+        return float(performed)
+    return 0.0
+
+
+def _encode_default(o):
+    if isinstance(o, datetime):
+        return {"$datetime": o.isoformat()}
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def _decode_hook(d):
+    if len(d) == 1 and "$datetime" in d:
+        return datetime.fromisoformat(d["$datetime"])
+    return d
+
+
+def action_id(payload: Dict[str, Any]) -> str:
+    # Stable across runs and processes, so writing the same action twice overwrites instead of duplicating.
+    data = json.dumps(payload, default=_encode_default, separators=(",", ":"), sort_keys=True)
+    return hashlib.sha1(data.encode("utf8")).hexdigest()
+
+
+def encode_payload(payload: Dict[str, Any]) -> bytes:
+    return json.dumps(payload, default=_encode_default, separators=(",", ":")).encode("utf8")
+
+
+def decode_payload(data: bytes) -> Dict[str, Any]:
+    return json.loads(data.decode("utf8"), object_hook=_decode_hook)
+
+
+class _Names:
+    # Names are interned into an append-only file of JSON lines, and index entries store their line number.
+
+    def __init__(self, path: str):
+        self.path = path
+        self._names: List[str] = list()
+        self._ids: Dict[str, int] = dict()
+        self._loaded = 0
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf8") as f:
+            f.seek(self._loaded)
+            for line in iter(f.readline, ""):
+                if not line.endswith("\n"):
+                    break
+                name = json.loads(line)
+                self._ids[name] = len(self._names)
+                self._names.append(name)
+                self._loaded = f.tell()
+
+    def find(self, name: str) -> Optional[int]:
+        if name not in self._ids:
+            self._load()
+        return self._ids.get(name)
+
+    def intern(self, name: str) -> int:
+        if self.find(name) is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "a", encoding="utf8") as f:
+                f.write(json.dumps(name) + "\n")
+            self._load()
+        return self._ids[name]
+
+    def name(self, name_id: int) -> str:
+        if name_id >= len(self._names):
+            self._load()
+        return self._names[name_id]
+
+
+@contextmanager
+def _mapped(path: str):
+    with open(path, "rb") as f:
+        if not os.fstat(f.fileno()).st_size:
+            yield b""
+            return
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield data
+        finally:
+            data.close()
+
+
+class ActionLog:
+
+    def __init__(self, path: str, segment_size: int = 16 * 1024 * 1024):
+        self.path = path
+        self.segment_size = segment_size
+        self._open_names()
+
+        self._log_file = None
+        self._index_file = None
+        self._segment_start = 0
+        self._segment_count = 0
+        self._segment_bytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        segments = self._segments()
+        if not segments:
+            return 0
+        version = self._index_version(segments[-1])
+        return segments[-1] + self._index_size(segments[-1], version) // INDEX_FORMATS[version][1].size
+
+    def __iter__(self):
+        return self.payloads()
+
+    def exists(self):
+        return bool(self._segments())
+
+    def segments(self) -> List[int]:
+        return self._segments()
+
+    def close(self):
+        for f in (self._log_file, self._index_file):
+            if f:
+                f.close()
+        self._log_file = self._index_file = None
+
+    def _open_names(self):
+        self._moderators = _Names(os.path.join(self.path, "moderators.txt"))
+        self._subreddits = _Names(os.path.join(self.path, "subreddits.txt"))
+
+    def _segment_path(self, start: int, ext: str) -> str:
+        return os.path.join(self.path, f"segment-{start:010d}.{ext}")
+
+    def _index_path(self, start: int, version: int = INDEX_VERSION) -> str:
+        return self._segment_path(start, INDEX_FORMATS[version][0])
+
+    def _segments(self) -> List[int]:
+        if not os.path.isdir(self.path):
+            return []
+        extensions = tuple(f".{ext}" for ext, _ in INDEX_FORMATS.values())
+        return sorted({int(f[8:18]) for f in os.listdir(self.path) if f.startswith("segment-") and
+                       f.endswith(extensions)})
+
+    def _index_version(self, start: int) -> int:
+        for version in sorted(INDEX_FORMATS, reverse=True):
+            if os.path.exists(self._index_path(start, version)):
+                return version
+        return INDEX_VERSION
+
+    def _index_size(self, start: int, version: int = INDEX_VERSION) -> int:
+        try:
+            return os.path.getsize(self._index_path(start, version))
+        except FileNotFoundError:
+            return 0
+
+    def upgrade(self) -> int:
+        upgraded = 0
+        for start in self._segments():
+            version = self._index_version(start)
+            if version != INDEX_VERSION:
+                upgraded += self._upgrade_segment(start, version)
+            for old_version in INDEX_FORMATS:
+                # Left behind if an upgrade was interrupted after the new index was in place.
+                if old_version != INDEX_VERSION and os.path.exists(self._index_path(start, old_version)):
+                    os.remove(self._index_path(start, old_version))
+        return upgraded
+
+    def _upgrade_segment(self, start: int, version: int) -> int:
+        entry_struct = INDEX_FORMATS[version][1]
+        entries = list()
+        with _mapped(self._index_path(start, version)) as index, _mapped(self._segment_path(start, "log")) as log:
+            for pos in range(0, len(index) - len(index) % entry_struct.size, entry_struct.size):
+                offset, length, *_ = entry_struct.unpack_from(index, pos)
+                payload = decode_payload(log[offset + RECORD_HEADER.size:offset + RECORD_HEADER.size + length])
+                entries.append(self._pack_entry(offset, length, payload))
+
+        # The new index replaces the old one in a single rename, so an interrupted upgrade just starts over.
+        tmp_path = self._index_path(start) + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(b"".join(entries))
+        os.replace(tmp_path, self._index_path(start))
+        return len(entries)
+
+    def _open_for_append(self):
+        os.makedirs(self.path, exist_ok=True)
+        self.upgrade()
+        segments = self._segments()
+        self._segment_start = segments[-1] if segments else 0
+        self._recover(self._segment_start)
+
+        self._log_file = open(self._segment_path(self._segment_start, "log"), "ab")
+        self._index_file = open(self._index_path(self._segment_start), "ab")
+        self._segment_bytes = self._log_file.tell()
+        self._segment_count = self._index_file.tell() // INDEX_ENTRY.size
+
+    def _recover(self, start: int):
+        # Drop torn index entries and re-index records that made it into the log before a crash.
+        log_path, index_path = self._segment_path(start, "log"), self._index_path(start)
+        for path in (log_path, index_path):
+            if not os.path.exists(path):
+                open(path, "wb").close()
+
+        index_size = os.path.getsize(index_path)
+        if index_size % INDEX_ENTRY.size:
+            index_size -= index_size % INDEX_ENTRY.size
+            with open(index_path, "r+b") as f:
+                f.truncate(index_size)
+
+        end = 0
+        if index_size:
+            with open(index_path, "rb") as f:
+                f.seek(index_size - INDEX_ENTRY.size)
+                offset, length, *_ = INDEX_ENTRY.unpack(f.read(INDEX_ENTRY.size))
+                end = offset + RECORD_HEADER.size + length
+
+        entries = list()
+        with open(log_path, "r+b") as f:
+            f.seek(end)
+            while True:
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    break
+                length, = RECORD_HEADER.unpack(header)
+                data = f.read(length)
+                if len(data) < length:
+                    break
+                entries.append((end, length, decode_payload(data)))
+                end += RECORD_HEADER.size + length
+            f.truncate(end)
+
+        if entries:
+            with open(index_path, "ab") as f:
+                for offset, length, payload in entries:
+                    f.write(self._pack_entry(offset, length, payload))
+
+    def _pack_entry(self, offset: int, length: int, payload: Dict[str, Any]) -> bytes:
+        return INDEX_ENTRY.pack(offset, length, get_timestamp(payload),
+                                self._moderators.intern(str(payload.get("user", ""))),
+                                ITEM_TYPES.index(get_item_type(payload)),
+                                self._subreddits.intern(get_subreddit(payload)),
+                                get_action_mask(payload))
+
+    def validate(self, payload: Dict[str, Any]) -> bytes:
+        # Raises for payloads that can't be encoded or indexed, before anything is written.
+        data = encode_payload(payload)
+        self._pack_entry(0, len(data), payload)
+        return data
+
+    def append(self, payload: Dict[str, Any]) -> int:
+        return self.extend([payload])[0]
+
+    def extend(self, payloads: Iterable[Dict[str, Any]]) -> List[int]:
+        records = [(payload, self.validate(payload)) for payload in payloads]
+        if not self._log_file:
+            self._open_for_append()
+
+        positions = list()
+        entries = list()
+        try:
+            for payload, data in records:
+                if self._segment_count and self._segment_bytes >= self.segment_size:
+                    self._flush(entries)
+                    self.close()
+                    self._segment_start += self._segment_count
+                    self._log_file = open(self._segment_path(self._segment_start, "log"), "ab")
+                    self._index_file = open(self._index_path(self._segment_start), "ab")
+                    self._segment_bytes = self._segment_count = 0
+
+                self._log_file.write(RECORD_HEADER.pack(len(data)) + data)
+                entries.append(self._pack_entry(self._segment_bytes, len(data), payload))
+
+                self._segment_bytes += RECORD_HEADER.size + len(data)
+                self._segment_count += 1
+                positions.append(self._segment_start + self._segment_count - 1)
+
+            self._flush(entries)
+        except BaseException:
+            # Reopening goes through recovery, which indexes every record that made it into the log and drops a
+            # torn one, so the index never falls behind the log.
+            self.close()
+            raise
+        return positions
+
+    def _flush(self, entries: List[bytes]):
+        # The records have to be on disk before the index entries pointing at them.
+        self._log_file.flush()
+        self._index_file.write(b"".join(entries))
+        self._index_file.flush()
+        entries.clear()
+
+    def entries(self, start: Optional[float] = None, end: Optional[float] = None, moderator: Optional[str] = None,
+                item_type: Optional[str] = None, since: int = 0, segment: Optional[int] = None,
+                subreddit: Optional[str] = None, action: Optional[str] = None) -> Iterator[IndexEntry]:
+        type_id = ITEM_TYPES.index(item_type) if item_type is not None else None
+        action_bit = 1 << ACTION_KINDS.index(action) if action is not None else None
+
+        segments = self._segments()
+        for i, first in enumerate(segments):
+            if i + 1 < len(segments) and segments[i + 1] <= since:
+                continue
+            if segment is not None and first != segment:
+                continue
+
+            version = self._index_version(first)
+            if version == INDEX_VERSION:
+                yield from self._scan_index(first, since, start, end, moderator, type_id, subreddit, action_bit)
+            else:
+                yield from self._scan_legacy_index(first, version, since, start, end, moderator, type_id, subreddit,
+                                                   action_bit)
+
+    def _scan_index(self, first: int, since: int, start: Optional[float], end: Optional[float],
+                    moderator: Optional[str], type_id: Optional[int], subreddit: Optional[str],
+                    action_bit: Optional[int]) -> Iterator[IndexEntry]:
+        # Names are compared by id, so a name that was never interned can't match anything.
+        moderator_id = self._moderators.find(moderator) if moderator is not None else None
+        subreddit_id = self._subreddits.find(subreddit) if subreddit is not None else None
+        if moderator is not None and moderator_id is None or subreddit is not None and subreddit_id is None:
+            return
+
+        log_path = self._segment_path(first, "log")
+        size = INDEX_ENTRY.size
+        with _mapped(self._index_path(first)) as index:
+            skip = max(0, since - first)
+            for pos in range(skip * size, len(index) - len(index) % size, size):
+                offset, length, timestamp, mod_id, t, sub_id, mask = INDEX_ENTRY.unpack_from(index, pos)
+                if start is not None and timestamp < start:
+                    continue
+                if end is not None and timestamp >= end:
+                    continue
+                if moderator_id is not None and mod_id != moderator_id:
+                    continue
+                if type_id is not None and t != type_id:
+                    continue
+                if subreddit_id is not None and sub_id != subreddit_id:
+                    continue
+                if action_bit is not None and not mask & action_bit:
+                    continue
+                yield IndexEntry(first + pos // size, timestamp, self._moderators.name(mod_id), ITEM_TYPES[t],
+                                 log_path, offset, length, self._subreddits.name(sub_id), mask)
+
+    def _scan_legacy_index(self, first: int, version: int, since: int, start: Optional[float],
+                           end: Optional[float], moderator: Optional[str], type_id: Optional[int],
+                           subreddit: Optional[str], action_bit: Optional[int]) -> Iterator[IndexEntry]:
+        # Older indexes don't have the subreddit or actions, so the records are classified as they're read.
+        log_path = self._segment_path(first, "log")
+        entry_struct = INDEX_FORMATS[version][1]
+        size = entry_struct.size
+        with _mapped(self._index_path(first, version)) as index, _mapped(log_path) as log:
+            skip = max(0, since - first)
+            for pos in range(skip * size, len(index) - len(index) % size, size):
+                offset, length, timestamp, mod_id, t = entry_struct.unpack_from(index, pos)
+                if start is not None and timestamp < start:
+                    continue
+                if end is not None and timestamp >= end:
+                    continue
+                mod_name = self._moderators.name(mod_id)
+                if moderator is not None and mod_name != moderator:
+                    continue
+                if type_id is not None and t != type_id:
+                    continue
+                payload = decode_payload(log[offset + RECORD_HEADER.size:offset + RECORD_HEADER.size + length])
+                sub_name, mask = get_subreddit(payload), get_action_mask(payload)
+                if subreddit is not None and sub_name != subreddit:
+                    continue
+                if action_bit is not None and not mask & action_bit:
+                    continue
+                yield IndexEntry(first + pos // size, timestamp, mod_name, ITEM_TYPES[t], log_path, offset, length,
+                                 sub_name, mask)
+
+    def read(self, entry: IndexEntry) -> Dict[str, Any]:
+        with open(entry.segment, "rb") as f:
+            f.seek(entry.offset + RECORD_HEADER.size)
+            return decode_payload(f.read(entry.length))
+
+    def records(self, **filters) -> Iterator[Tuple[IndexEntry, Dict[str, Any]]]:
+        for log_path, entries in groupby(self.entries(**filters), key=lambda entry: entry.segment):
+            with _mapped(log_path) as log:
+                for entry in entries:
+                    start = entry.offset + RECORD_HEADER.size
+                    yield entry, decode_payload(log[start:start + entry.length])
+
+    def payloads(self, **filters) -> Iterator[Dict[str, Any]]:
+        for _, payload in self.records(**filters):
+            yield payload
+
+
+def read_pickle_payloads(path: str) -> Iterator[Any]:
+    with open(path, "rb") as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                break
+
+
+def migrate_pickle(source: str, log: ActionLog, batch_size: int = 1000) -> int:
+    if log.exists():
+        raise ValueError(f"{log.path} already contains mod actions.")
+
+    # The log is built next to its final location and only moved into place once complete, so a migration that
+    # crashes leaves no partial log behind and simply runs again on the next start.
+    tmp_path = os.path.normpath(log.path) + ".migrating"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+
+    count = 0
+    batch = list()
+    with ActionLog(tmp_path, log.segment_size) as tmp_log:
+        os.makedirs(tmp_path, exist_ok=True)
+        for payload in read_pickle_payloads(source):
+            batch.append(payload)
+            if len(batch) >= batch_size:
+                count += len(tmp_log.extend(batch))
+                batch.clear()
+        if batch:
+            count += len(tmp_log.extend(batch))
+
+    log.close()
+    shutil.rmtree(log.path, ignore_errors=True)
+    os.replace(tmp_path, log.path)
+    log._open_names()
+    return count
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "upgrade":
+        with ActionLog(sys.argv[2]) as action_log:
+            print(action_log.upgrade(), "mod actions re-indexed.")
+        sys.exit(0)
+
+    if len(sys.argv) != 3:
+        print("Usage: python -m helpers.action_log <payloads pickle> <action log directory>\n"
+              "       python -m helpers.action_log upgrade <action log directory>")
+        sys.exit(1)
+
+    with ActionLog(sys.argv[2]) as action_log:
+        if action_log.exists():
+            print(f"{sys.argv[2]} already contains {len(action_log)} mod actions, not migrating.")
+            sys.exit(1)
+        print(migrate_pickle(sys.argv[1], action_log), "mod actions migrated.")
@@ -0,0 +1,158 @@
+import json
+import os
+import time
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+
+from .action_log import ActionLog
+
+DAY = 24 * 60 * 60
+
+# Windows of whole UTC days up to and including today, None meaning all-time. The shortest one restarts at
+# midnight UTC, so it's called "today" rather than a rolling 24 hours.
+WINDOWS = {
+    "today": 1,
+    "7d": 7,
+    "30d": 30,
+    "all": None
+}
+
+
+class Leaderboard:
+
+    def __init__(self):
+        self.counts: Dict[str, int] = dict()
+        self._ranking: List[Tuple[int, str]] = list()
+
+    def add(self, user: str, delta: int = 1):
+        count = self.counts.get(user, 0)
+        if count:
+            del self._ranking[bisect_left(self._ranking, (-count, user))]
+
+        count += delta
+        if count > 0:
+            self.counts[user] = count
+            insort(self._ranking, (-count, user))
+        else:
+            self.counts.pop(user, None)
+
+    def top(self, n: Optional[int] = None) -> List[Tuple[str, int]]:
+        return [(user, -count) for count, user in self._ranking[:n]]
+
+
+class ActionStats:
+    TYPES = ("submissions", "comments")
+
+    def __init__(self, counts: Dict[str, Dict[str, int]] = None, position: int = 0,
+                 days: Dict[str, Dict[str, Dict[str, int]]] = None, now: Optional[float] = None):
+        self.counts = {t: dict((counts or {}).get(t, {})) for t in self.TYPES}
+        self.days = {t: {int(day): dict(users) for day, users in (days or {}).get(t, {}).items()} for t in self.TYPES}
+        self.position = position
+
+        self.today = int((now or time.time()) // DAY)
+        self.boards = {t: {w: Leaderboard() for w in WINDOWS} for t in self.TYPES}
+
+        for t in self.TYPES:
+            for user, count in self.counts[t].items():
+                self.boards[t]["all"].add(user, count)
+        self._prune()
+        for t in self.TYPES:
+            for day, users in self.days[t].items():
+                self._add_to_windows(t, day, users, 1)
+
+    def __getitem__(self, t: str) -> Dict[str, int]:
+        return self.counts[t]
+
+    def items(self):
+        return self.counts.items()
+
+    def _windows_for(self, day: int):
+        for window, length in WINDOWS.items():
+            if length is not None and self.today - length < day <= self.today:
+                yield window
+
+    def _add_to_windows(self, t: str, day: int, users: Dict[str, int], sign: int):
+        for window in self._windows_for(day):
+            for user, count in users.items():
+                self.boards[t][window].add(user, sign * count)
+
+    def _prune(self):
+        oldest = self.today - max(length for length in WINDOWS.values() if length)
+        for t in self.TYPES:
+            for day in [day for day in self.days[t] if day <= oldest]:
+                del self.days[t][day]
+
+    def advance(self, now: Optional[float] = None) -> bool:
+        today = int((now or time.time()) // DAY)
+        if today <= self.today:
+            return False
+
+        # Take every bucket out of the windows it was in and put it back into the ones it's still in.
+        for t in self.TYPES:
+            for day, users in self.days[t].items():
+                self._add_to_windows(t, day, users, -1)
+        self.today = today
+        self._prune()
+        for t in self.TYPES:
+            for day, users in self.days[t].items():
+                self._add_to_windows(t, day, users, 1)
+        return True
+
+    def record(self, item_type: str, user: str, position: Optional[int] = None,
+               timestamp: Optional[float] = None) -> bool:
+        if position is not None:
+            self.position = max(self.position, position)
+
+        t = f"{item_type}s"
+        if t not in self.counts:
+            return False
+
+        # The action log stores names as strings, so live actions are counted under the same keys as replayed ones.
+        user = str(user)
+
+        self.counts[t][user] = self.counts[t].get(user, 0) + 1
+        self.boards[t]["all"].add(user)
+
+        timestamp = time.time() if timestamp is None else timestamp
+        if timestamp:
+            day = int(timestamp // DAY)
+            if day > self.today:
+                self.advance(timestamp)
+            if day > self.today - max(length for length in WINDOWS.values() if length):
+                self.days[t].setdefault(day, dict())
+                self.days[t][day][user] = self.days[t][day].get(user, 0) + 1
+                self._add_to_windows(t, day, {user: 1}, 1)
+
+        return True
+
+    def top(self, t: str, window: str = "all", n: Optional[int] = None) -> List[Tuple[str, int]]:
+        return self.boards[t][window].top(n)
+
+    def catch_up(self, action_log: ActionLog) -> int:
+        if self.position > len(action_log):
+            # The checkpoint is ahead of the log it was taken from, so it can't be trusted.
+            self.__init__()
+
+        replayed = 0
+        for entry in action_log.entries(since=self.position):
+            self.record(entry.item_type, entry.moderator, entry.position + 1, entry.timestamp)
+            replayed += 1
+        return replayed
+
+    @classmethod
+    def load(cls, path: str) -> 'ActionStats':
+        try:
+            with open(path, encoding="utf8") as f:
+                checkpoint = json.load(f)
+            return cls(checkpoint["counts"], checkpoint["position"], checkpoint.get("days"))
+        except FileNotFoundError:
+            return cls()
+        except (ValueError, KeyError) as e:
+            print(f"Ignoring invalid stats checkpoint {path}: {e}")
+            return cls()
+
+    def save(self, path: str):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf8") as f:
+            json.dump({"position": self.position, "counts": self.counts, "days": self.days}, f)
+        os.replace(tmp_path, path)
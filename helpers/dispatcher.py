@@ -0,0 +1,184 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+import discord
+
+from .metrics import metrics
+
+
+class _Job:
+    __slots__ = ("enqueued", "kwargs", "future", "on_sent")
+
+    def __init__(self, kwargs: Dict[str, Any], future: asyncio.Future,
+                 on_sent: Optional[Callable[[discord.Message], Awaitable[None]]]):
+        self.enqueued = time.monotonic()
+        self.kwargs = kwargs
+        self.future = future
+        self.on_sent = on_sent
+
+
+class _ChannelQueue:
+
+    def __init__(self, channel: discord.abc.Messageable, priority: int, rate: int, per: float):
+        self.channel = channel
+        self.priority = priority
+        self.jobs: Deque[_Job] = deque()
+        self.busy = False
+
+        self.rate = rate
+        self.per = per
+        self.tokens = float(rate)
+        self.updated = time.monotonic()
+
+        self.sent = 0
+        self.failed = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    def refill(self, now: float):
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate / self.per)
+        self.updated = now
+
+    def ready_in(self, now: float) -> float:
+        self.refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) * self.per / self.rate
+
+
+class Dispatcher:
+
+    def __init__(self, priorities: Dict[int, int] = None, default_priority: int = 5, max_pending: int = 500,
+                 rate: int = 5, per: float = 5.0, concurrency: int = 4):
+        self.priorities = priorities or dict()
+        self.default_priority = default_priority
+        self.rate = rate
+        self.per = per
+
+        self._channels: Dict[int, _ChannelQueue] = dict()
+        self._max_pending = max_pending
+        self._concurrency = concurrency
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._senders: Optional[asyncio.Semaphore] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._slots = self._slots or asyncio.Semaphore(self._max_pending)
+            self._senders = self._senders or asyncio.Semaphore(self._concurrency)
+            self._wakeup = self._wakeup or asyncio.Event()
+            self._task = asyncio.get_event_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            while any(q.jobs or q.busy for q in self._channels.values()):
+                await asyncio.sleep(0.1)
+            self._task.cancel()
+            self._task = None
+
+    async def send(self, channel: discord.abc.Messageable, priority: Optional[int] = None,
+                   on_sent: Optional[Callable[[discord.Message], Awaitable[None]]] = None,
+                   **kwargs) -> asyncio.Future:
+        # get_channel returns None for a misconfigured channel id.
+        if channel is None:
+            raise ValueError("Can't send to a channel that doesn't exist.")
+
+        self.start()
+        # Waits while too many sends are pending, which pushes back on the Banhammer handlers.
+        await self._slots.acquire()
+
+        try:
+            queue = self._channels.get(channel.id)
+            if not queue:
+                queue = self._channels[channel.id] = _ChannelQueue(
+                    channel, self.priorities.get(channel.id, self.default_priority), self.rate, self.per)
+            if priority is not None:
+                queue.priority = priority
+
+            future = asyncio.get_event_loop().create_future()
+            queue.jobs.append(_Job(kwargs, future, on_sent))
+        except BaseException:
+            # The slot is only handed back by _send, so a job that never got queued has to return it here.
+            self._slots.release()
+            raise
+
+        self._wakeup.set()
+        return future
+
+    def _next(self, now: float):
+        ready = None
+        wait = None
+        for queue in self._channels.values():
+            if not queue.jobs or queue.busy:
+                continue
+            delay = queue.ready_in(now)
+            if delay > 0:
+                wait = delay if wait is None else min(wait, delay)
+                continue
+            if not ready or (queue.priority, queue.jobs[0].enqueued) < (ready.priority, ready.jobs[0].enqueued):
+                ready = queue
+        return ready, wait
+
+    async def _run(self):
+        while True:
+            await self._senders.acquire()
+            while True:
+                queue, wait = self._next(time.monotonic())
+                if queue:
+                    break
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+
+            queue.busy = True
+            queue.tokens -= 1
+            asyncio.get_event_loop().create_task(self._send(queue, queue.jobs.popleft()))
+
+    async def _send(self, queue: _ChannelQueue, job: _Job):
+        try:
+            with metrics.span("discord.send"):
+                message = await queue.channel.send(**job.kwargs)
+        except Exception as e:
+            queue.failed += 1
+            print(f"Error sending message to {queue.channel}: {e}")
+            if not job.future.cancelled():
+                job.future.set_exception(e)
+                # Nobody may be awaiting the future, so retrieve the exception to keep asyncio quiet.
+                job.future.exception()
+        else:
+            queue.sent += 1
+            queue.last_lag = time.monotonic() - job.enqueued
+            metrics.observe("discord.send_lag", queue.last_lag)
+            queue.max_lag = max(queue.max_lag, queue.last_lag)
+            if not job.future.cancelled():
+                job.future.set_result(message)
+            if job.on_sent:
+                asyncio.get_event_loop().create_task(self._after_send(job, message))
+        finally:
+            queue.busy = False
+            self._slots.release()
+            self._senders.release()
+            self._wakeup.set()
+
+    async def _after_send(self, job: _Job, message: discord.Message):
+        try:
+            await job.on_sent(message)
+        except Exception as e:
+            print(f"Error after sending message: {e}")
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        now = time.monotonic()
+        return {
+            str(queue.channel): {
+                "priority": queue.priority,
+                "pending": len(queue.jobs),
+                "sent": queue.sent,
+                "failed": queue.failed,
+                "last_lag": queue.last_lag,
+                "max_lag": queue.max_lag,
+                "oldest_wait": now - queue.jobs[0].enqueued if queue.jobs else 0.0
+            } for queue in self._channels.values()
+        }
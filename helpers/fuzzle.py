@@ -1,16 +1,95 @@
+from collections import Counter
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple, Union
+
+
+class FuzzleResult(NamedTuple):
+    option: Any
+    coverage: float
+    accuracy: float
+    cat: int
+    construct: str
+    match: bool
+
+
 def get_parts(s):
-    parts = list()
-    for size in range(1, len(s) + 1):
-        for i in range(0, len(s) - size + 1):
-            part = s[i:i + size]
-            if part not in parts:
-                parts.append(part)
+    parts = list(dict.fromkeys(s[i:i + size] for size in range(1, len(s) + 1) for i in range(0, len(s) - size + 1)))
 
     parts.sort(key=lambda s: len(s), reverse=True)
 
     return parts
 
 
+def score(key: str, tags: List[str], search: str, words: List[str],
+          max_coverage: float) -> Optional[Tuple[float, float, int, str, int]]:
+    construct = ""
+    last = -1
+    for size in range(min(len(search), len(key)), 0, -1):  # reverse loop through the possible lengths
+        for i in range(0, len(search) - size + 1):
+            part = search[i:i + size]
+            index = key.find(part)
+            if index != -1 and part not in construct:
+                if index - 1 >= last and index - 1 < last + 3:  # for lower margins
+                    construct += part
+                    last = index + size - 1
+
+    coverage = len(construct) / len(search)
+
+    match = 1 if key == search else 0
+    word_matches = set()
+    tag_match = False
+    tag_occurence = False
+    starts_with = 2 if key.startswith(search) else 0
+    starts_with_word = 0
+    starts_with_key = 1 if search.startswith(key) else 0
+    key_in_search = 1 if key in search else 0
+    search_in_key = 2 if search in key else 0
+
+    for word in words:
+        for word1 in key.split(" "):
+            if word == word1 or word1.startswith(word) or word1.endswith(
+                    word) or word.startswith(word1) or word.endswith(word1):
+                if key.startswith(word1):
+                    starts_with_word = 2
+                word_matches.add(word1)
+
+        for tag in tags:
+            if search == tag:
+                tag_match = True
+            if word in tag:
+                tag_occurence = True
+
+    possible_accuracy = 1 + 2 + 1 + 1 + 2 + 2 + len(words)
+    accuracy = (match + starts_with + starts_with_word + starts_with_key +
+                key_in_search + search_in_key + len(word_matches)) / possible_accuracy
+
+    if coverage < max_coverage and not tag_match and not tag_occurence:  # and accuracy < 0.2:
+        return None
+
+    typo_tolerance = len(key) / 5
+
+    cat = 7
+    if match == 1:
+        cat = 0
+    elif search_in_key == 2 or (len(construct) - len(key)) <= typo_tolerance:
+        cat = 1
+    elif starts_with == 2:
+        cat = 2
+    elif tag_match:
+        cat = 3
+    elif starts_with_word == 2:
+        cat = 4
+    elif key_in_search == 1:
+        cat = 5
+    elif starts_with_key == 1:
+        cat = 6
+    elif tag_occurence:
+        cat = 7
+    else:
+        return None
+
+    return coverage, accuracy, cat, construct, match
+
+
 def find(options, search, return_all=False, coverage_multiplier=0.02975):
     search = search.lower().strip()
 
@@ -25,78 +104,13 @@ def find(options, search, return_all=False, coverage_multiplier=0.02975):
             option = {"key": option}
 
         key = option["key"].lower().strip()
-        tags = option["tags"] if "tags" in option else list()
-
-        construct = ""
-        last = -1
-        for size in range(len(search), 0, -1):  # reverse loop through the possible lengths
-            for i in range(0, len(search) - size + 1):
-                part = search[i:i + size]
-                if part in key and part not in construct:
-                    if key.index(part) - 1 >= last and key.index(part) - 1 < last + 3:  # for lower margins
-                        construct += part
-                        last = key.index(part) + size - 1
-
-        coverage = len(construct) / len(search)
-
-        match = 1 if key == search else 0
-        word_matches = set()
-        tag_match = False
-        tag_occurence = False
-        starts_with = 2 if key.startswith(search) else 0
-        starts_with_word = 0
-        starts_with_key = 1 if search.startswith(key) else 0
-        key_in_search = 1 if key in search else 0
-        search_in_key = 2 if search in key else 0
-
-        for word in words:
-            for word1 in key.split(" "):
-                if word == word1 or word1.startswith(word) or word1.endswith(
-                        word) or word.startswith(word1) or word.endswith(word1):
-                    if key.startswith(word1):
-                        starts_with_word = 2
-                    word_matches.add(word1)
-
-            for tag in tags:
-                tag = tag.lower()
-                if search == tag:
-                    tag_match = True
-                if word in tag:
-                    tag_occurence = True
-
-        possible_accuracy = 1 + 2 + 1 + 1 + 2 + 2 + len(words)
-        accuracy = (match + starts_with + starts_with_word + starts_with_key +
-                    key_in_search + search_in_key + len(word_matches)) / possible_accuracy
-
-        if coverage < max_coverage and not tag_match and not tag_occurence:  # and accuracy < 0.2:
-            continue
+        tags = [tag.lower() for tag in option["tags"]] if "tags" in option else list()
 
-        typo_tolerance = len(key) / 5
-
-        cat = 7
-        if match == 1:
-            cat = 0
-        elif search_in_key == 2 or (len(construct) - len(key)) <= typo_tolerance:
-            cat = 1
-        elif starts_with == 2:
-            cat = 2
-        elif tag_match:
-            cat = 3
-        elif starts_with_word == 2:
-            cat = 4
-        elif key_in_search == 1:
-            cat = 5
-        elif starts_with_key == 1:
-            cat = 6
-        elif tag_occurence:
-            cat = 7
-        else:
+        scored = score(key, tags, search, words, max_coverage)
+        if not scored:
             continue
 
-        option["coverage"] = coverage
-        option["accuracy"] = accuracy
-        option["cat"] = cat
-        option["construct"] = construct
+        option["coverage"], option["accuracy"], option["cat"], option["construct"], match = scored
         option["match"] = match == 1
 
         if not return_all and match == 1:
@@ -107,3 +121,98 @@ def find(options, search, return_all=False, coverage_multiplier=0.02975):
     results.sort(key=lambda i: i["cat"])
 
     return results
+
+
+class FuzzleIndex:
+
+    def __init__(self, options: Iterable[Union[str, Dict[str, Any]]]):
+        self.options = list()
+        self._keys: List[str] = list()
+        self._tags: List[List[str]] = list()
+
+        self._chars: Dict[str, List[Tuple[int, int]]] = dict()
+        self._tag_ids: Dict[str, List[int]] = dict()
+        self._tag_grams: Dict[str, Set[int]] = dict()
+        self._tagged: List[int] = list()
+        self._exact: Dict[str, int] = dict()
+
+        for option in options:
+            self.add(option)
+
+    def __len__(self):
+        return len(self.options)
+
+    def add(self, option: Union[str, Dict[str, Any]]):
+        option_id = len(self.options)
+        key = (option if isinstance(option, str) else option["key"]).lower().strip()
+        tags = [tag.lower() for tag in option.get("tags", list())] if isinstance(option, dict) else list()
+
+        self.options.append(option)
+        self._keys.append(key)
+        self._tags.append(tags)
+        self._exact.setdefault(key, option_id)
+
+        for char, count in Counter(key).items():
+            self._chars.setdefault(char, list()).append((option_id, count))
+
+        if tags:
+            self._tagged.append(option_id)
+        for tag in tags:
+            self._tag_ids.setdefault(tag, list()).append(option_id)
+            for i in range(len(tag) - 2):
+                self._tag_grams.setdefault(tag[i:i + 3], set()).add(option_id)
+
+    def _candidates(self, search: str, words: List[str], max_coverage: float) -> List[int]:
+        if not search or max_coverage <= 0:
+            return list(range(len(self.options)))
+
+        # The construct is made of non-overlapping parts of the key that also appear in the search, so it can't
+        # be longer than the number of key characters found in the search. That bound skips most options exactly.
+        bounds = dict()
+        for char in set(search):
+            for option_id, count in self._chars.get(char, ()):
+                bounds[option_id] = bounds.get(option_id, 0) + count
+
+        candidates = {option_id for option_id, bound in bounds.items()
+                      if not min(bound, len(self._keys[option_id])) / len(search) < max_coverage}
+        candidates.update(self._tag_ids.get(search, ()))
+
+        for word in set(words):
+            if len(word) >= 3:
+                grams = [self._tag_grams.get(word[i:i + 3], set()) for i in range(len(word) - 2)]
+                possible = set.intersection(*grams)
+            else:
+                possible = self._tagged
+            candidates.update(option_id for option_id in possible
+                              if any(word in tag for tag in self._tags[option_id]))
+
+        return sorted(candidates)
+
+    def find(self, search: str, return_all: bool = False, coverage_multiplier: float = 0.02975) -> List[FuzzleResult]:
+        search = search.lower().strip()
+        words = search.split(" ")
+        max_coverage = 1 - len(search) * coverage_multiplier
+
+        if not return_all and search in self._exact:
+            option_id = self._exact[search]
+            return [FuzzleResult(self.options[option_id], *score(search, self._tags[option_id], search, words,
+                                                                 max_coverage)[:4], True)]
+
+        results = list()
+
+        for option_id in self._candidates(search, words, max_coverage):
+            scored = score(self._keys[option_id], self._tags[option_id], search, words, max_coverage)
+            if not scored:
+                continue
+
+            coverage, accuracy, cat, construct, match = scored
+            result = FuzzleResult(self.options[option_id], coverage, accuracy, cat, construct, match == 1)
+
+            if not return_all and match == 1:
+                return [result]
+            results.append(result)
+
+        results.sort(key=lambda r: r.accuracy, reverse=True)
+        results.sort(key=lambda r: r.cat)
+
+        return results
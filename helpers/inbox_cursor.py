@@ -0,0 +1,57 @@
+import json
+import os
+from typing import Any, Iterable, Optional
+
+
+class InboxCursor:
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.created = None
+        self.ids = set()
+
+        if path:
+            self.load()
+
+    @property
+    def initialized(self) -> bool:
+        return self.created is not None
+
+    def is_new(self, msg: Any) -> bool:
+        created = msg._data.get("created_utc", 0)
+        return created > self.created or (created == self.created and msg.id not in self.ids)
+
+    def is_older(self, msg: Any) -> bool:
+        # Inbox listings are sorted newest first, so anything older than the cursor ends the scan.
+        return msg._data.get("created_utc", 0) < self.created
+
+    def advance(self, msgs: Iterable[Any]):
+        if self.created is None:
+            self.created = 0
+
+        for msg in msgs:
+            created = msg._data.get("created_utc", 0)
+            if created > self.created:
+                self.created = created
+                self.ids = {msg.id}
+            elif created == self.created:
+                self.ids.add(msg.id)
+
+        if self.path:
+            self.save()
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf8") as f:
+                state = json.load(f)
+            self.created, self.ids = state["created"], set(state["ids"])
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError) as e:
+            print(f"Ignoring invalid inbox cursor {self.path}: {e}")
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf8") as f:
+            json.dump({"created": self.created, "ids": sorted(self.ids)}, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,109 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import apraw
+
+from .metrics import metrics
+
+# /api/info accepts at most 100 fullnames per request.
+MAX_BATCH_SIZE = 100
+
+
+class InfoBatcher:
+
+    def __init__(self, reddit: apraw.Reddit, batch_size: int = MAX_BATCH_SIZE, deadline: float = 0.5,
+                 snapshot_size: int = 2048, snapshot_ttl: float = 60.0):
+        self.reddit = reddit
+        self.batch_size = min(batch_size, MAX_BATCH_SIZE)
+        self.deadline = deadline
+        self.snapshot_size = snapshot_size
+        self.snapshot_ttl = snapshot_ttl
+
+        self.requests = 0
+        self.fetched = 0
+        self.last_latency = 0.0
+
+        self._snapshot: 'OrderedDict[str, Tuple[float, Dict[str, Any]]]' = OrderedDict()
+        self._pending: 'OrderedDict[str, List[asyncio.Future]]' = OrderedDict()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "requests": self.requests,
+            "fetched": self.fetched,
+            "avg_batch_size": self.fetched / self.requests if self.requests else 0.0,
+            "last_latency": self.last_latency,
+            "snapshot_size": len(self._snapshot)
+        }
+
+    def get(self, fullname: str) -> Optional[Dict[str, Any]]:
+        entry = self._snapshot.get(fullname)
+        if entry is None or entry[0] < time.monotonic() - self.snapshot_ttl:
+            return None
+        return entry[1]
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._wakeup = self._wakeup or asyncio.Event()
+            self._task = asyncio.get_event_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def submit(self, fullname: str) -> asyncio.Future:
+        self.start()
+        future = asyncio.get_event_loop().create_future()
+        self._pending.setdefault(fullname, list()).append(future)
+        self._wakeup.set()
+        return future
+
+    async def refresh(self, fullname: str) -> Optional[Dict[str, Any]]:
+        return await self.submit(fullname)
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+
+            # Reports come in bursts, so wait briefly for the rest of the burst before making the request.
+            deadline = time.monotonic() + self.deadline
+            while len(self._pending) < self.batch_size and time.monotonic() < deadline:
+                await asyncio.sleep(min(0.05, self.deadline))
+
+            while self._pending:
+                fullnames = list(self._pending)[:self.batch_size]
+                futures = {fullname: self._pending.pop(fullname) for fullname in fullnames}
+                await self._fetch(futures)
+
+    async def _fetch(self, futures: Dict[str, List[asyncio.Future]]):
+        start = time.perf_counter()
+        results = dict()
+        try:
+            async for thing in self.reddit.info(ids=list(futures)):
+                results[thing.fullname] = thing._data
+        except Exception as e:
+            print(f"Error fetching info for {len(futures)} items: {e}")
+
+        self.last_latency = time.perf_counter() - start
+        self.requests += 1
+        self.fetched += len(futures)
+        metrics.observe("reddit.info", self.last_latency)
+
+        now = time.monotonic()
+        for fullname, data in results.items():
+            self._snapshot.pop(fullname, None)
+            self._snapshot[fullname] = (now, data)
+        while len(self._snapshot) > self.snapshot_size:
+            self._snapshot.popitem(last=False)
+
+        # Items missing from the response resolve to None so their embeds fall back to the item's own data.
+        for fullname, waiting in futures.items():
+            for future in waiting:
+                if not future.done():
+                    future.set_result(results.get(fullname))
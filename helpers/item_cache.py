@@ -0,0 +1,79 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import discord
+from banhammer.models import RedditItem
+
+
+class ItemCache:
+
+    def __init__(self, maxsize: int = 2048, ttl: float = 12 * 60 * 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+
+        self._items: 'OrderedDict[int, Tuple[float, discord.Message, RedditItem]]' = OrderedDict()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, message_id: int):
+        return self._peek(message_id) is not None
+
+    def put(self, message: discord.Message, item: Union[RedditItem, Callable[[], Optional[RedditItem]]],
+            age: float = 0.0):
+        self._items.pop(message.id, None)
+        self._items[message.id] = (time.monotonic() - age, message, item)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def get(self, message_id: int) -> Optional[Tuple[discord.Message, RedditItem]]:
+        entry = self._peek(message_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def pop(self, message_id: int):
+        self._items.pop(message_id, None)
+
+    def entries(self) -> List[Tuple[float, discord.Message, RedditItem]]:
+        self._expire()
+        now = time.monotonic()
+        return [(now - added, message, item) for added, message, item in self._items.values()]
+
+    def _peek(self, message_id: int) -> Optional[Tuple[discord.Message, RedditItem]]:
+        self._expire()
+        if message_id not in self._items:
+            return None
+        added, message, item = self._items[message_id]
+        if not isinstance(item, RedditItem):
+            # Entries restored from a snapshot are only rebuilt once someone reacts to them.
+            item = item()
+            if item is None:
+                del self._items[message_id]
+                return None
+            self._items[message_id] = (added, message, item)
+        return message, item
+
+    def _expire(self):
+        # Entries are kept in insertion order, so the expired ones are always at the front.
+        deadline = time.monotonic() - self.ttl
+        while self._items:
+            added, *_ = next(iter(self._items.values()))
+            if added > deadline:
+                break
+            self._items.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._items),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
@@ -1,15 +1,24 @@
+from typing import Optional
+
 import discord
 from discord import Embed
 from banhammer.models import MessageBuilder, RedditItem
 
+from .info_batcher import InfoBatcher
+
 
 class MessageBuilder(MessageBuilder):
 
+    def __init__(self, info: Optional[InfoBatcher] = None):
+        self.info = info
+
     async def get_item_embed(self, item: RedditItem, *args, **kwargs):
         embed = await super().get_item_embed(item, *args, **kwargs)
 
         if item.type in ["submission", "comment"] and item.source == "reports":
-            txt = f"\nScore: `{item.item.score}`"
+            snapshot = self.info.get(item.item.fullname) if self.info else None
+            score = snapshot.get("score", item.item.score) if snapshot else item.item.score
+            txt = f"\nScore: `{score}`"
             embed.description = embed.description + txt if embed.description else txt
 
         return embed
@@ -0,0 +1,141 @@
+import functools
+import json
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Optional
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+
+    def __init__(self, size: int = 2048):
+        # Quantiles come from the most recent samples, so recording is just an append.
+        self.samples: Deque[float] = deque(maxlen=size)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def quantiles(self) -> Dict[float, float]:
+        samples = sorted(self.samples)
+        if not samples:
+            return {q: 0.0 for q in QUANTILES}
+        return {q: samples[min(len(samples) - 1, int(q * len(samples)))] for q in QUANTILES}
+
+
+class Metrics:
+
+    def __init__(self, prefix: str = "lcb"):
+        self.prefix = prefix
+        self.histograms: Dict[str, Histogram] = dict()
+        self.errors: Dict[str, int] = dict()
+        self.counters: Dict[str, int] = dict()
+        self.gauges: Dict[str, float] = dict()
+
+    def observe(self, name: str, seconds: float):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.observe(seconds)
+
+    def inc(self, name: str, value: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def set(self, name: str, value: float):
+        self.gauges[name] = value
+
+    @contextmanager
+    def span(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.errors[name] = self.errors.get(name, 0) + 1
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def timed(self, name: Optional[str] = None):
+        def decorator(func: Callable):
+            span_name = name or func.__name__
+
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with self.span(span_name):
+                    return await func(*args, **kwargs)
+
+            return wrapper
+        return decorator
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        spans = dict()
+        for name, histogram in sorted(self.histograms.items()):
+            errors = self.errors.get(name, 0)
+            spans[name] = {
+                "count": histogram.count,
+                "errors": errors,
+                "error_rate": errors / histogram.count if histogram.count else 0.0,
+                "mean": histogram.total / histogram.count if histogram.count else 0.0,
+                "max": histogram.max,
+                **{f"p{int(q * 100)}": v for q, v in histogram.quantiles().items()}
+            }
+        return spans
+
+    def prometheus(self) -> str:
+        lines = [f"# TYPE {self.prefix}_span_seconds summary"]
+        for name, histogram in sorted(self.histograms.items()):
+            for q, v in histogram.quantiles().items():
+                lines.append(f'{self.prefix}_span_seconds{{span="{name}",quantile="{q}"}} {v:.6f}')
+            lines.append(f'{self.prefix}_span_seconds_sum{{span="{name}"}} {histogram.total:.6f}')
+            lines.append(f'{self.prefix}_span_seconds_count{{span="{name}"}} {histogram.count}')
+
+        lines.append(f"# TYPE {self.prefix}_span_errors_total counter")
+        for name in sorted(self.histograms):
+            lines.append(f'{self.prefix}_span_errors_total{{span="{name}"}} {self.errors.get(name, 0)}')
+
+        lines.append(f"# TYPE {self.prefix}_events_total counter")
+        for name, value in sorted(self.counters.items()):
+            lines.append(f'{self.prefix}_events_total{{event="{name}"}} {value}')
+
+        lines.append(f"# TYPE {self.prefix}_gauge gauge")
+        for name, value in sorted(self.gauges.items()):
+            lines.append(f'{self.prefix}_gauge{{name="{name}"}} {value}')
+
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf8") as f:
+            f.write(self.prometheus())
+        os.replace(tmp_path, path)
+
+    def write_summary(self, path: str):
+        # Lets another process show these metrics, e.g. the gateway's !perf for a split ingest process.
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf8") as f:
+            json.dump({"created": time.time(), "spans": self.snapshot(), "counters": self.counters,
+                       "gauges": self.gauges}, f)
+        os.replace(tmp_path, path)
+
+
+def read_summary(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, encoding="utf8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except ValueError as e:
+        print(f"Ignoring invalid metrics summary {path}: {e}")
+        return None
+
+
+metrics = Metrics()
@@ -0,0 +1,210 @@
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .action_log import ActionLog, action_id, decode_payload, encode_payload
+
+# Firestore rejects batched writes with more than 500 operations.
+MAX_BATCH_SIZE = 500
+
+
+class PersistenceWorker:
+
+    def __init__(self, action_log: ActionLog, db: Any = None, collection: str = "mod_actions",
+                 spool_path: str = "mod_actions.spool", max_queue: int = 1000, batch_size: int = MAX_BATCH_SIZE,
+                 linger: float = 0.05, max_retries: int = 4, backoff: float = 0.5, max_backoff: float = 30.0,
+                 db_factory: Optional[Callable[[], Any]] = None):
+        self.action_log = action_log
+        self.db = db
+        self.db_factory = db_factory
+        self.collection = collection
+        self.spool_path = spool_path
+        self.batch_size = min(batch_size, MAX_BATCH_SIZE)
+        self.linger = linger
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self.listeners: List[Callable[[Dict[str, Any], int], Optional[Awaitable[None]]]] = list()
+
+        self.flushes = 0
+        self.flushed = 0
+        self.retries = 0
+        self.spooled = 0
+        self.last_flush_latency = 0.0
+        self.total_flush_latency = 0.0
+
+        self._max_queue = max_queue
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.load_spool()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    @property
+    def avg_flush_latency(self) -> float:
+        return self.total_flush_latency / self.flushes if self.flushes else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.queue_depth,
+            "flushes": self.flushes,
+            "flushed": self.flushed,
+            "retries": self.retries,
+            "spooled": self.spooled,
+            "last_flush_latency": self.last_flush_latency,
+            "avg_flush_latency": self.avg_flush_latency
+        }
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._queue = self._queue or asyncio.Queue(self._max_queue)
+            self._task = asyncio.get_event_loop().create_task(self._run())
+
+    async def put(self, payload: Dict[str, Any]):
+        self.start()
+        # Waits while the queue is full, which pushes back on the reaction handlers.
+        await self._queue.put(payload)
+
+    async def flush(self):
+        if self._queue:
+            await self._queue.join()
+
+    async def stop(self):
+        if self._task:
+            await self.flush()
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+
+            deadline = time.monotonic() + self.linger
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    if time.monotonic() >= deadline:
+                        break
+                    await asyncio.sleep(min(0.01, self.linger))
+
+            try:
+                await self._write(batch)
+            except Exception as e:
+                print(f"Error persisting mod actions: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _write(self, batch: List[Dict[str, Any]]):
+        loop = asyncio.get_event_loop()
+        start = time.perf_counter()
+
+        batch, positions = await loop.run_in_executor(None, self._append, batch)
+
+        for payload, position in zip(batch, positions):
+            for listener in self.listeners:
+                try:
+                    result = listener(payload, position)
+                    if asyncio.iscoroutine(result):
+                        await result
+                except Exception as e:
+                    print(f"Error in persistence listener: {e}")
+
+        if batch and (self.db is not None or self.db_factory):
+            await self._write_firestore(batch)
+
+        self.last_flush_latency = time.perf_counter() - start
+        self.total_flush_latency += self.last_flush_latency
+        self.flushes += 1
+        self.flushed += len(batch)
+
+    def _append(self, batch: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[int]]:
+        # A payload that can't be stored is dropped on its own instead of taking the rest of its batch with it.
+        valid = list()
+        for payload in batch:
+            try:
+                self.action_log.validate(payload)
+            except Exception as e:
+                print(f"Dropping mod action that can't be stored: {e}")
+            else:
+                valid.append(payload)
+
+        # The batch still goes to Firestore or the spool when the local log can't be written.
+        try:
+            return valid, self.action_log.extend(valid)
+        except Exception as e:
+            print(f"Error appending mod actions to the action log: {e}")
+            return valid, []
+
+    async def _write_firestore(self, batch: List[Dict[str, Any]]):
+        loop = asyncio.get_event_loop()
+
+        # Once the backend has been unreachable, new batches only get a single attempt until the spool drains.
+        attempts = 1 if self.spooled else self.max_retries + 1
+        for attempt in range(attempts):
+            try:
+                await loop.run_in_executor(None, self._commit, batch)
+                break
+            except Exception as e:
+                print(f"Error writing mod actions to Firestore (attempt {attempt + 1}/{attempts}): {e}")
+                if attempt + 1 < attempts:
+                    self.retries += 1
+                    await asyncio.sleep(min(self.max_backoff, self.backoff * 2 ** attempt))
+        else:
+            await loop.run_in_executor(None, self._spool, batch)
+            return
+
+        if self.spooled:
+            try:
+                await loop.run_in_executor(None, self._drain_spool)
+            except Exception as e:
+                print(f"Error draining Firestore spool: {e}")
+
+    def _commit(self, payloads: List[Dict[str, Any]]):
+        if self.db is None:
+            # Runs in the executor, so connecting on the first write doesn't block the event loop.
+            self.db = self.db_factory()
+        collection = self.db.collection(self.collection)
+        batch = self.db.batch()
+        for payload in payloads:
+            batch.set(collection.document(action_id(payload)), payload)
+        batch.commit()
+
+    def _spool(self, payloads: List[Dict[str, Any]]):
+        with open(self.spool_path, "ab") as f:
+            for payload in payloads:
+                f.write(encode_payload(payload) + b"\n")
+        self.spooled += len(payloads)
+
+    def _drain_spool(self):
+        if not os.path.exists(self.spool_path):
+            self.spooled = 0
+            return
+
+        with open(self.spool_path, "rb") as f:
+            payloads = [decode_payload(line) for line in f if line.strip()]
+
+        for i in range(0, len(payloads), self.batch_size):
+            self._commit(payloads[i:i + self.batch_size])
+            # Rewrite what's left so a failure halfway doesn't resend committed batches.
+            remaining = payloads[i + self.batch_size:]
+            tmp_path = self.spool_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                for payload in remaining:
+                    f.write(encode_payload(payload) + b"\n")
+            os.replace(tmp_path, self.spool_path)
+            self.spooled = len(remaining)
+
+        os.remove(self.spool_path)
+        self.spooled = 0
+
+    def load_spool(self):
+        if os.path.exists(self.spool_path):
+            with open(self.spool_path, "rb") as f:
+                self.spooled = sum(1 for line in f if line.strip())
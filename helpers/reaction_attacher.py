@@ -0,0 +1,88 @@
+import asyncio
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import discord
+
+from .metrics import metrics
+
+
+class ReactionAttacher:
+
+    def __init__(self, concurrency: int = 4, max_retries: int = 3, backoff: float = 1.0, max_backoff: float = 30.0):
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self.added = 0
+        self.failed = 0
+        self.retries = 0
+        self.last_latency = 0.0
+
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._chains: Dict[int, asyncio.Task] = dict()
+
+    @property
+    def pending(self) -> int:
+        return len(self._chains)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": self.pending,
+            "added": self.added,
+            "failed": self.failed,
+            "retries": self.retries,
+            "last_latency": self.last_latency
+        }
+
+    def attach(self, message: discord.Message, emojis: Iterable[str]) -> asyncio.Task:
+        self._slots = self._slots or asyncio.Semaphore(self.concurrency)
+
+        # Reactions show up in the order they were added, so a message's emojis go one after the other, after any
+        # earlier batch for the same message. Different messages are worked on concurrently.
+        previous = self._chains.get(message.id)
+        task = asyncio.get_event_loop().create_task(self._attach(message, list(emojis), previous))
+        self._chains[message.id] = task
+        task.add_done_callback(lambda t: self._chains.pop(message.id) if self._chains.get(message.id) is t else None)
+        return task
+
+    async def stop(self):
+        tasks = list(self._chains.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._chains.clear()
+
+    async def _attach(self, message: discord.Message, emojis: List[str], previous: Optional[asyncio.Task]):
+        if previous:
+            await asyncio.wait([previous])
+
+        async with self._slots:
+            start = time.perf_counter()
+            for emoji in emojis:
+                try:
+                    await self._add(message, emoji)
+                except discord.NotFound:
+                    # The message was deleted, usually because a mod already acted on it.
+                    return
+                except Exception as e:
+                    self.failed += 1
+                    print(f"Failed to add reaction '{emoji}': {e}")
+
+            self.last_latency = time.perf_counter() - start
+            metrics.observe("reactions.attach", self.last_latency)
+
+    async def _add(self, message: discord.Message, emoji: str):
+        for attempt in range(self.max_retries + 1):
+            try:
+                await message.add_reaction(emoji)
+                self.added += 1
+                return
+            except discord.HTTPException as e:
+                # discord.py already retries rate limits a few times, this only kicks in once it gives up.
+                if e.status != 429 or attempt == self.max_retries:
+                    raise
+                self.retries += 1
+                retry_after = e.response.headers.get("Retry-After") if e.response is not None else None
+                await asyncio.sleep(min(self.max_backoff, float(retry_after or self.backoff * 2 ** attempt)))
@@ -0,0 +1,143 @@
+import asyncio
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+
+import apraw
+import discord
+from apraw.models import Comment, Submission
+from banhammer.models import RedditItem, Subreddit
+
+
+def dump_item(item: RedditItem, keys: Optional[Iterable[str]] = None) -> Optional[Dict[str, Any]]:
+    # Only submissions and comments can be rebuilt from their data alone, other items are looked up by their URL.
+    if item.type not in ("submission", "comment"):
+        return None
+    data = item.item._data
+    if keys is not None:
+        data = {key: data[key] for key in keys if key in data}
+    return {"type": item.type, "source": item.source, "subreddit": str(item.subreddit), "data": data}
+
+
+def load_item(reddit: apraw.Reddit, subreddits: Iterable[Subreddit],
+              data: Optional[Dict[str, Any]]) -> Optional[RedditItem]:
+    if not data:
+        return None
+    subreddit = next((sub for sub in subreddits if str(sub).lower() == data["subreddit"].lower()), None)
+    if subreddit is None:
+        return None
+    cls = Submission if data["type"] == "submission" else Comment
+    return RedditItem(cls(reddit, dict(data["data"])), subreddit, data["source"])
+
+
+class RenderJob:
+    __slots__ = ("channel", "embed", "reactions", "item_data", "created", "item")
+
+    def __init__(self, channel: str, embed: Dict[str, Any], reactions: List[str],
+                 item_data: Optional[Dict[str, Any]] = None, item: Optional[RedditItem] = None):
+        self.channel = channel
+        self.embed = embed
+        self.reactions = reactions
+        self.item_data = item_data
+        self.created = time.time()
+        # Jobs that stay in this process keep the item itself, the other process rebuilds it from item_data.
+        self.item = item
+
+    @classmethod
+    def from_item(cls, channel: str, item: RedditItem, embed: discord.Embed) -> 'RenderJob':
+        return cls(channel, embed.to_dict(), [r.emoji for r in item.reactions], dump_item(item), item)
+
+    def __getstate__(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__ if slot != "item"}
+
+    def __setstate__(self, state: Dict[str, Any]):
+        for slot in self.__slots__:
+            setattr(self, slot, state.get(slot))
+
+
+class LocalJobQueue:
+
+    def __init__(self, maxsize: int = 500):
+        self.maxsize = maxsize
+        self._queue: Optional[asyncio.Queue] = None
+
+    @property
+    def queue(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue(self.maxsize)
+        return self._queue
+
+    def qsize(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    async def put(self, job: RenderJob):
+        # Waits while the queue is full, which pushes back on the Banhammer handlers.
+        await self.queue.put(job)
+
+    async def get(self) -> RenderJob:
+        return await self.queue.get()
+
+    def task_done(self):
+        self.queue.task_done()
+
+    async def join(self):
+        # Returns once every job that was put has been taken and marked done.
+        await self.queue.join()
+
+    def close(self):
+        pass
+
+
+class ProcessJobQueue:
+
+    def __init__(self, jobs: Any, poll_interval: float = 0.5):
+        # jobs is a multiprocessing queue shared by the ingest and gateway processes.
+        self.jobs = jobs
+        self.poll_interval = poll_interval
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._unfinished = 0
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        # A process either only puts or only gets, so one thread is enough and the default executor stays free.
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(1, thread_name_prefix="render-jobs")
+        return self._executor
+
+    def qsize(self) -> int:
+        try:
+            return self.jobs.qsize()
+        except NotImplementedError:
+            return 0
+
+    async def put(self, job: RenderJob):
+        # The queue is bounded, so a full queue blocks the executor thread and the handler waits on it.
+        await asyncio.get_event_loop().run_in_executor(self.executor, self.jobs.put, job)
+
+    async def get(self) -> RenderJob:
+        while True:
+            job = await asyncio.get_event_loop().run_in_executor(self.executor, self._get)
+            if job is not None:
+                self._unfinished += 1
+                return job
+
+    def _get(self) -> Optional[RenderJob]:
+        # Gets time out regularly so the executor thread doesn't keep the process alive after a shutdown.
+        try:
+            return self.jobs.get(timeout=self.poll_interval)
+        except queue.Empty:
+            return None
+
+    def task_done(self):
+        self._unfinished -= 1
+
+    async def join(self):
+        # Only the consuming process can tell when its jobs are done, the queue itself is shared.
+        while self.qsize() or self._unfinished:
+            await asyncio.sleep(self.poll_interval)
+
+    def close(self):
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
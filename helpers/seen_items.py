@@ -0,0 +1,108 @@
+import os
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+
+class SeenItems:
+
+    def __init__(self, path: Optional[str] = None, ttl: float = 48 * 60 * 60, max_items: int = 100000):
+        self.path = path
+        self.ttl = ttl
+        self.max_items = max_items
+
+        self._items: 'OrderedDict[Tuple[str, str], float]' = OrderedDict()
+        self._journal = None
+        self._journal_lines = 0
+
+        if path:
+            self._load()
+
+    def __len__(self):
+        self._expire()
+        return len(self._items)
+
+    def __contains__(self, item_id: str):
+        return self.contains(item_id)
+
+    def contains(self, item_id: str, *sources: str) -> bool:
+        self._expire()
+        if sources:
+            return any((source, item_id) in self._items for source in sources)
+        return any(key[1] == item_id for key in self._items)
+
+    def add(self, item_id: str, source: str) -> bool:
+        key = (source, item_id)
+        added = key not in self._items
+        now = time.time()
+
+        self._items.pop(key, None)
+        self._items[key] = now
+        self._expire(now)
+
+        if self.path:
+            self._write(now, source, item_id)
+
+        return added
+
+    def recent(self, source: str, limit: int) -> List[str]:
+        self._expire()
+        ids = list()
+        for key in reversed(self._items):
+            if len(ids) == limit:
+                break
+            if key[0] == source:
+                ids.append(key[1])
+        # Oldest first, the order they were seen in.
+        return ids[::-1]
+
+    def _expire(self, now: Optional[float] = None):
+        # Entries are kept in the order they were last seen, so expired ones are always at the front.
+        deadline = (now or time.time()) - self.ttl
+        while self._items and (next(iter(self._items.values())) < deadline or len(self._items) > self.max_items):
+            self._items.popitem(last=False)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+
+        deadline = time.time() - self.ttl
+        with open(self.path, encoding="utf8") as f:
+            for line in f:
+                self._journal_lines += 1
+                try:
+                    ts, source, item_id = line.rstrip("\n").split("\t")
+                    ts = float(ts)
+                except ValueError:
+                    continue
+                if ts >= deadline:
+                    self._items.pop((source, item_id), None)
+                    self._items[(source, item_id)] = ts
+
+        self._expire()
+        self.compact()
+
+    def _write(self, ts: float, source: str, item_id: str):
+        if self._journal_lines > 2 * len(self._items) + 1024:
+            self.compact()
+
+        if not self._journal:
+            self._journal = open(self.path, "a", encoding="utf8")
+        self._journal.write(f"{ts:.0f}\t{source}\t{item_id}\n")
+        self._journal.flush()
+        self._journal_lines += 1
+
+    def compact(self):
+        # Rewrites the journal with only the live entries so it stays proportional to the window.
+        self.close()
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf8") as f:
+            for (source, item_id), ts in self._items.items():
+                f.write(f"{ts:.0f}\t{source}\t{item_id}\n")
+        os.replace(tmp_path, self.path)
+        self._journal_lines = len(self._items)
+
+    def close(self):
+        if self._journal:
+            self._journal.close()
+            self._journal = None
@@ -0,0 +1,31 @@
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+
+class StartupProfile:
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: List[Tuple[str, float]] = list()
+        self.marks: Dict[str, float] = dict()
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start))
+
+    def mark(self, name: str) -> bool:
+        # Only the first occurrence counts, so marks can sit on hot paths like posting items.
+        if name in self.marks:
+            return False
+        self.marks[name] = time.perf_counter() - self.started
+        return True
+
+    def report(self) -> str:
+        phases = ", ".join(f"{name} {duration * 1000:.0f}ms" for name, duration in self.phases)
+        marks = ", ".join(f"{name} after {elapsed:.2f}s" for name, elapsed in self.marks.items())
+        return f"Startup: {phases}" + (f"; {marks}" if marks else "")
@@ -0,0 +1,125 @@
+import os
+import pickle
+import time
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from banhammer.models import RedditItem, Subreddit
+
+from .metrics import metrics
+from .render_jobs import dump_item
+from .seen_items import SeenItems
+
+# Bumped whenever the layout changes, snapshots from another version are ignored.
+VERSION = 1
+
+# Banhammer's id set and first-poll flag for each stream.
+STREAMS = {
+    "new": ("_new_ids", "_skip_new"),
+    "comments": ("_comment_ids", "_skip_comments"),
+    "reports": ("_report_ids", "_skip_reports"),
+    "mail": ("_mail_ids", "_skip_mail"),
+    "queue": ("_queue_ids", "_skip_queue"),
+    "mod_actions": ("_mod_action_ids", "_skip_mod_actions")
+}
+
+# Reactions refresh items before acting on them, so cached items only keep what identifies them and what their
+# action records need. Bodies are cut to the length Banhammer shows anyway.
+ITEM_KEYS = ("id", "name", "subreddit", "link_id", "permalink", "url", "author", "title", "selftext", "body",
+             "created_utc", "score", "approved_by", "removed_by")
+BODY_LENGTH = 1024
+
+
+def dump_streams(subreddit: Subreddit, seen: SeenItems) -> Dict[str, List[str]]:
+    # Banhammer's id sets can't be listed, but every handler journals the ids of its stream in the seen items.
+    # Streams that haven't polled yet still skip their first listing and have nothing worth keeping.
+    return {name: seen.recent(name, getattr(subreddit, ids).max_items) for name, (ids, skip) in STREAMS.items()
+            if not getattr(subreddit, skip)}
+
+
+def load_streams(subreddit: Subreddit, streams: Dict[str, List[str]], seen: Optional[SeenItems] = None):
+    for name, ids in streams.items():
+        if name not in STREAMS:
+            continue
+        ids_attr, skip_attr = STREAMS[name]
+        if not getattr(subreddit, skip_attr):
+            continue
+
+        # The seen items journal is written on every item, so it also covers what came in after the last snapshot.
+        bounded = getattr(subreddit, ids_attr)
+        recent = seen.recent(name, bounded.max_items) if seen else []
+        for item_id in ids + recent:
+            if item_id not in bounded:
+                bounded.add(item_id)
+
+        # With the ids back the first listing can be posted instead of skipped, it only holds items missed while down.
+        setattr(subreddit, skip_attr, False)
+
+
+class RestoredItem:
+    __slots__ = ("data", "load")
+
+    def __init__(self, data: Dict[str, Any], load: Callable[[Dict[str, Any]], Optional[RedditItem]]):
+        self.data = data
+        self.load = load
+
+    def __call__(self) -> Optional[RedditItem]:
+        return self.load(self.data)
+
+
+def dump_cached_item(item: Union[RedditItem, RestoredItem]) -> Optional[Dict[str, Any]]:
+    if isinstance(item, RestoredItem):
+        return item.data
+    data = dump_item(item, ITEM_KEYS)
+    if data:
+        for key in ("selftext", "body"):
+            if isinstance(data["data"].get(key), str):
+                data["data"][key] = data["data"][key][:BODY_LENGTH]
+    return data
+
+
+class WarmState:
+
+    def __init__(self, path: str, max_age: float = 30 * 60):
+        self.path = path
+        self.max_age = max_age
+
+        self.last_size = 0
+        self.last_latency = 0.0
+
+    def save(self, state: Dict[str, Any]):
+        # Plain containers pickle several times faster than JSON, which keeps a full item cache in the low ms.
+        start = time.perf_counter()
+        data = pickle.dumps({"version": VERSION, "created": time.time(), **state}, pickle.HIGHEST_PROTOCOL)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+
+        self.last_size = len(data)
+        self.last_latency = time.perf_counter() - start
+        metrics.observe("warm_state.save", self.last_latency)
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.path, "rb") as f:
+                state = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Ignoring invalid warm state {self.path}: {e}")
+            return None
+
+        if not isinstance(state, dict) or state.get("version") != VERSION:
+            print(f"Ignoring warm state {self.path} from another version.")
+            return None
+        return state
+
+    def is_stale(self, state: Dict[str, Any]) -> bool:
+        # After a long outage the listings are full of items nobody expects to see posted anymore.
+        return time.time() - state["created"] > self.max_age
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": self.last_size,
+            "last_latency": self.last_latency
+        }
@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+import re
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+# Bumped whenever the artifact layout or the way patterns are built changes, which invalidates every artifact.
+ARTIFACT_VERSION = 1
+
+
+class WordMatch(NamedTuple):
+    word: str
+    start: int
+    end: int
+
+
+def _trie_pattern(node: Dict) -> str:
+    # Turns the trie into a prefix-factored alternation, so the regex engine only follows the branches
+    # that match the current character instead of trying every word at every position.
+    end = "" in node
+    branches = [re.escape(char) + _trie_pattern(child) for char, child in sorted(node.items()) if char]
+
+    if not branches:
+        return ""
+
+    if len(branches) == 1 and not end:
+        return branches[0]
+
+    pattern = "(?:" + "|".join(branches) + ")"
+    return pattern + "?" if end else pattern
+
+
+def word_list_path(languages: Iterable[str]) -> str:
+    # The English list is curated by hand, other languages come straight from DirtyWords.json.
+    return "assets/DirtyWords_en.txt" if list(languages) == ["en"] else "assets/DirtyWords.json"
+
+
+def artifact_key(source: str, languages: Iterable[str]) -> str:
+    # Keyed by the source's content, so an edited word list never picks up an artifact built from the old one.
+    digest = hashlib.sha256(f"{ARTIFACT_VERSION}:{','.join(sorted(set(languages)))}:".encode())
+    with open(source, "rb") as f:
+        digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+class WordMatcher:
+
+    def __init__(self, words: Iterable[str], pattern: Optional[str] = None):
+        self.words = list(dict.fromkeys(w.strip() for w in words if w.strip()))
+        self._lookup = {w.lower(): w for w in self.words}
+
+        if pattern is None and self._lookup:
+            trie = dict()
+            for word in self._lookup:
+                node = trie
+                for char in word:
+                    node = node.setdefault(char, dict())
+                node[""] = True
+            pattern = r"\b({0})\b".format(_trie_pattern(trie))
+
+        self.pattern = re.compile(pattern, flags=re.IGNORECASE) if pattern else None
+
+    def __len__(self):
+        return len(self.words)
+
+    def __getstate__(self):
+        # The pattern travels as a string, so unpickling only compiles it instead of rebuilding the trie.
+        return {"words": self.words, "pattern": self.pattern.pattern if self.pattern else None}
+
+    def __setstate__(self, state):
+        self.__init__(state["words"], state.get("pattern"))
+
+    @classmethod
+    def from_file(cls, path: str) -> 'WordMatcher':
+        with open(path, encoding="utf8") as f:
+            return cls(f.read().splitlines())
+
+    @classmethod
+    def from_json(cls, path: str, languages: Iterable[str] = ("en",)) -> 'WordMatcher':
+        languages = set(languages)
+        with open(path, encoding="utf8") as f:
+            return cls(record["word"] for record in json.load(f)["RECORDS"] if record["language"] in languages)
+
+    @classmethod
+    def load(cls, path: str) -> 'WordMatcher':
+        with open(path, encoding="utf8") as f:
+            state = json.load(f)
+        if state.get("version") != ARTIFACT_VERSION:
+            raise ValueError(f"Artifact {path} has version {state.get('version')}, expected {ARTIFACT_VERSION}.")
+        return cls(state["words"], state["pattern"])
+
+    def save(self, path: str, **meta):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf8") as f:
+            json.dump({"version": ARTIFACT_VERSION, **meta, **self.__getstate__()}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def search(self, text: str) -> Optional[WordMatch]:
+        if not self.pattern:
+            return None
+        match = self.pattern.search(text)
+        return self._to_word_match(match) if match else None
+
+    def finditer(self, text: str) -> Iterator[WordMatch]:
+        if not self.pattern:
+            return
+        for match in self.pattern.finditer(text):
+            yield self._to_word_match(match)
+
+    def findall(self, text: str) -> List[WordMatch]:
+        return list(self.finditer(text))
+
+    def matched_words(self, text: str) -> Set[str]:
+        return {match.word for match in self.finditer(text)}
+
+    def _to_word_match(self, match: re.Match) -> WordMatch:
+        return WordMatch(self._lookup.get(match.group(1).lower(), match.group(1)), match.start(), match.end())
+
+
+def build_artifact(source: str, languages: Iterable[str], directory: str) -> Tuple[WordMatcher, str]:
+    languages = sorted(set(languages))
+    key = artifact_key(source, languages)
+    matcher = WordMatcher.from_file(source) if source.endswith(".txt") else WordMatcher.from_json(source, languages)
+    os.makedirs(directory, exist_ok=True)
+    matcher.save(os.path.join(directory, f"words-{key}.json"), key=key, languages=languages)
+    return matcher, key
+
+
+def load_artifact(source: str, languages: Iterable[str], directory: str) -> Tuple[WordMatcher, str]:
+    key = artifact_key(source, languages)
+    try:
+        return WordMatcher.load(os.path.join(directory, f"words-{key}.json")), key
+    except FileNotFoundError:
+        pass
+    except (ValueError, KeyError) as e:
+        print(f"Rebuilding invalid word list artifact {key}: {e}")
+    return build_artifact(source, languages, directory)
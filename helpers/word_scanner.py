@@ -0,0 +1,166 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Tuple
+
+from .metrics import metrics
+from .word_matcher import WordMatch, WordMatcher
+
+_worker_matcher: Optional[WordMatcher] = None
+
+
+def _init_worker(matcher: WordMatcher):
+    global _worker_matcher
+    _worker_matcher = matcher
+
+
+def _scan_batch(bodies: List[str], matcher: Optional[WordMatcher] = None) -> List[Optional[WordMatch]]:
+    matcher = matcher or _worker_matcher
+    return [matcher.search(body) for body in bodies]
+
+
+class WordScanner:
+    MODES = ("process", "thread", "inline")
+
+    def __init__(self, matcher: WordMatcher, mode: str = "process", workers: int = 2, batch_size: int = 32):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown word scanner mode {mode!r}, expected one of {', '.join(self.MODES)}.")
+
+        self.matcher = matcher
+        self.mode = mode
+        self.workers = workers
+        self.batch_size = batch_size
+
+        self.scanned = 0
+        self.batches = 0
+        self.busy_time = 0.0
+        self.last_batch_latency = 0.0
+
+        self._executor: Optional[Executor] = None
+        self._pending: List[Tuple[str, asyncio.Future]] = list()
+        self._in_flight: Optional[asyncio.Semaphore] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._pending)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "words": len(self.matcher),
+            "queue_depth": self.queue_depth,
+            "scanned": self.scanned,
+            "batches": self.batches,
+            "avg_batch_size": self.scanned / self.batches if self.batches else 0.0,
+            "last_batch_latency": self.last_batch_latency,
+            "throughput": self.scanned / self.busy_time if self.busy_time else 0.0
+        }
+
+    def _create_executor(self, matcher: WordMatcher) -> Optional[Executor]:
+        if self.mode == "process":
+            # Workers get the matcher once when they start instead of with every batch. Pools are also replaced
+            # while the bot runs, when forking would copy locks held by its other threads, so workers are spawned.
+            return ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=_init_worker, initargs=(matcher,))
+        elif self.mode == "thread":
+            return ThreadPoolExecutor(self.workers, thread_name_prefix="word-scanner")
+        return None
+
+    def prepare(self):
+        # Spawned workers take a moment to start, so they're started before the first comment needs them.
+        if self._executor is None:
+            self._executor = self._create_executor(self.matcher)
+            self._spawn_workers()
+
+    def _spawn_workers(self):
+        if self.mode == "process":
+            for _ in range(self.workers):
+                self._executor.submit(_scan_batch, [])
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._executor = self._executor or self._create_executor(self.matcher)
+            self._in_flight = self._in_flight or asyncio.Semaphore(self.workers)
+            self._wakeup = self._wakeup or asyncio.Event()
+            self._task = asyncio.get_event_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def swap(self, matcher: WordMatcher):
+        # Batches already handed to the old matcher or pool finish on it, everything after goes to the new one.
+        self.matcher = matcher
+        if self.mode != "process" or self._executor is None:
+            return
+
+        old, self._executor = self._executor, self._create_executor(matcher)
+        # Start the new workers right away so the next batch doesn't wait on them.
+        self._spawn_workers()
+        old.shutdown(wait=False)
+
+    def submit(self, body: str) -> asyncio.Future:
+        future = asyncio.get_event_loop().create_future()
+        if self.mode == "inline":
+            future.set_result(self.matcher.search(body))
+            self.scanned += 1
+            return future
+
+        self.start()
+        self._pending.append((body, future))
+        self._wakeup.set()
+        return future
+
+    async def scan(self, body: str) -> Optional[WordMatch]:
+        return await self.submit(body)
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+
+            # An idle worker takes whatever is pending right away, bodies only batch up while all workers are busy.
+            while self._pending:
+                await self._in_flight.acquire()
+                batch, self._pending = self._pending[:self.batch_size], self._pending[self.batch_size:]
+                asyncio.get_event_loop().create_task(self._scan(batch))
+
+    async def _scan(self, batch: List[Tuple[str, asyncio.Future]]):
+        loop = asyncio.get_event_loop()
+        start = time.perf_counter()
+        try:
+            bodies = [body for body, _ in batch]
+            if self.mode == "process":
+                results = await loop.run_in_executor(self._executor, _scan_batch, bodies)
+            else:
+                results = await loop.run_in_executor(self._executor, _scan_batch, bodies, self.matcher)
+        except Exception as e:
+            print(f"Error scanning comments for words: {e}")
+            if isinstance(e, BrokenProcessPool) and self._executor is not None:
+                # A worker died, so the pool is unusable. It's shut down and a new one takes the next batch.
+                broken, self._executor = self._executor, self._create_executor(self.matcher)
+                broken.shutdown(wait=False)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self._in_flight.release()
+
+            self.last_batch_latency = time.perf_counter() - start
+            self.busy_time += self.last_batch_latency
+            self.batches += 1
+            self.scanned += len(batch)
+            metrics.observe("word_scan.batch", self.last_batch_latency)
+            metrics.set("word_scan.queue_depth", self.queue_depth)
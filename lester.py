@@ -1,16 +1,18 @@
+import argparse
 import asyncio
 import configparser
+import functools
 import logging
+import multiprocessing
 import os
-import pickle
-import re
+import time
 from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
 
 import apraw
 import discord
-from apraw.utils import BoundedSet
 from banhammer import Banhammer
-from banhammer.models import EventHandler, ItemAttribute, RedditItem, Subreddit
+from banhammer.models import EventHandler, ItemAttribute, Reaction, RedditItem, Subreddit
 from discord.ext import commands
 from discord.ext.commands import Bot
 from discord.utils import escape_markdown
@@ -19,7 +21,22 @@ import firebase
 import stats
 from cmds import HelpCommand
 from config import config as lc_config
-from helpers import MessageBuilder
+from helpers import MessageBuilder, WordMatcher
+from helpers.action_log import get_item_type, get_timestamp, migrate_pickle
+from helpers.action_stats import ActionStats
+from helpers.async_cache import AsyncTTLCache
+from helpers.dispatcher import Dispatcher
+from helpers.info_batcher import InfoBatcher
+from helpers.item_cache import ItemCache
+from helpers.metrics import metrics
+from helpers.persistence import PersistenceWorker
+from helpers.reaction_attacher import ReactionAttacher
+from helpers.render_jobs import LocalJobQueue, ProcessJobQueue, RenderJob, load_item
+from helpers.seen_items import SeenItems
+from helpers.startup_profile import StartupProfile
+from helpers.warm_state import RestoredItem, WarmState, dump_cached_item, dump_streams, load_streams
+from helpers.word_matcher import artifact_key, load_artifact, word_list_path
+from helpers.word_scanner import WordScanner
 
 logger = logging.getLogger("banhammer")
 
@@ -30,63 +47,416 @@ fileHandle.setFormatter(formatter)
 fileHandle.setLevel(logging.WARNING)
 logger.addHandler(fileHandle)
 
-reddit = apraw.Reddit("LCB")
 gta_green = discord.Colour(0).from_rgb(207, 226, 206)
 
+# Lower numbers are sent first when several channels are waiting on Discord's rate limits.
+CHANNEL_PRIORITIES = {
+    "reports_channel": 0,
+    "mail_channel": 1,
+    "queue_channel": 2,
+    "reposts_channel": 3,
+    "no_no_words_channel": 3,
+    "actions_channel": 4,
+    "new_channel": 5,
+    "comments_channel": 5
+}
+
 intents = discord.Intents.default()
 intents.members = True
 
+# How long mods get to confirm a reaction to an item another mod already acted on.
+CONFIRMATION_TIMEOUT = 2 * 60
+
+# "single" runs everything in one process, "ingest" polls Reddit and renders items into jobs for a "gateway" process.
+ROLES = ("single", "ingest", "gateway")
+
 
 class LesterCrest(Bot, Banhammer):
-    def __init__(self, **options):
-        super().__init__(lc_config["command_prefix"], help_command=HelpCommand(gta_green),
-                         description="/r/gtaonline's moderation bot using Banhammer.py.", intents=intents,
-                         **options)
-        Banhammer.__init__(self, reddit, bot=self, embed_color=gta_green, message_builder=MessageBuilder(),
-                           change_presence=lc_config["change_presence"])
-
-        self._new_ids = BoundedSet(301)
-        self._comment_ids = BoundedSet(301)
-        self._report_ids = BoundedSet(301)
-
-        with open("assets/DirtyWords_en.txt") as f:
-            self.words = f.read().splitlines()
-            self.word_patterns = [re.compile(r'\b({0})\b'.format(w), flags=re.IGNORECASE) for w in self.words]
-
-        self.action_stats = {
-            t: stats.get_users_action_count(stats.split_actions_by_user(payloads)) for t,
-            payloads in stats.get_actions_by_type().items()}
+    # Bumped whenever cogs or commands change so the help command knows to rebuild its pages and search index.
+    commands_version = 0
+
+    def __init__(self, reddit: apraw.Reddit = None, role: str = "single", jobs: Any = None, ingest_stop: Any = None,
+                 ingest_process: Any = None, **options):
+        if role not in ROLES:
+            raise ValueError(f"Unknown role {role!r}, expected one of {', '.join(ROLES)}.")
+
+        self.role = role
+        # In split mode the gateway sets ingest_stop when it shuts down, and the ingest process stops once it's set.
+        self.ingest_stop = ingest_stop
+        self.ingest_process = ingest_process
+        self.startup = StartupProfile()
+
+        with self.startup.phase("clients"):
+            super().__init__(lc_config["command_prefix"], help_command=HelpCommand(gta_green),
+                             description="/r/gtaonline's moderation bot using Banhammer.py.", intents=intents,
+                             **options)
+            reddit = reddit or apraw.Reddit("LCB")
+            self.info_batcher = InfoBatcher(reddit, deadline=lc_config.get("info_batch_deadline", 0.5))
+            Banhammer.__init__(self, reddit, bot=self, embed_color=gta_green,
+                               message_builder=MessageBuilder(self.info_batcher),
+                               change_presence=lc_config["change_presence"] and role == "single")
+
+        self.seen_items = None
+        if role != "gateway":
+            with self.startup.phase("seen items"):
+                self.seen_items = SeenItems(lc_config.get("seen_items_file", "seen_items.log"),
+                                            ttl=lc_config.get("seen_items_ttl", 48 * 60 * 60))
+
+        # Both processes get the multiprocessing queue, in a single process the jobs never leave the event loop.
+        self.jobs = ProcessJobQueue(jobs) if jobs is not None else \
+            LocalJobQueue(lc_config.get("render_queue_size", 500))
+        self._job_consumer: Optional[asyncio.Task] = None
+
+        self.item_cache = ItemCache(lc_config.get("item_cache_size", 2048))
+        self.reddit_cache = AsyncTTLCache(lc_config.get("reddit_cache_size", 512),
+                                          lc_config.get("reddit_cache_ttl", 5 * 60))
+
+        priorities = {**CHANNEL_PRIORITIES, **lc_config.get("channel_priorities", {})}
+        self.dispatcher = Dispatcher({lc_config[k]: v for k, v in priorities.items() if k in lc_config})
+        self.reaction_attacher = ReactionAttacher(lc_config.get("reaction_concurrency", 4))
+
+        # Confirmation DMs still waiting on a mod, keyed by the DM's id so a restart can pick them back up.
+        self.pending_confirmations: Dict[int, Tuple] = dict()
+        # Work handlers hand off so Banhammer can move on to the next item, drained before shutting down.
+        self.background_tasks: Set[asyncio.Task] = set()
+        self._report_slots: Optional[asyncio.Semaphore] = None
+
+        # In split mode both processes keep a snapshot of their own state next to each other.
+        self.warm_state = WarmState(self.role_path(lc_config.get("warm_state_file", "warm_state.pickle")),
+                                    max_age=lc_config.get("warm_state_max_age", 30 * 60))
+        self.warm_state_loaded = False
+        self._warm_state_saver: Optional[asyncio.Task] = None
+        self._metrics_exporter: Optional[asyncio.Task] = None
+        self._poller: Optional[asyncio.Task] = None
+
+        with self.startup.phase("word matcher"):
+            self.word_languages = list(lc_config.get("word_languages", ["en"]))
+            self.word_matcher, self.word_list_key = self.load_word_matcher(self.word_languages)
+            self.word_scanner = WordScanner(self.word_matcher, mode=lc_config.get("word_scanner_mode", "process"),
+                                            workers=lc_config.get("word_scanner_workers", 2),
+                                            batch_size=lc_config.get("word_scanner_batch_size", 32))
+            if role != "gateway":
+                self.word_scanner.prepare()
+        self._word_list_watcher: Optional[asyncio.Task] = None
+
         self.stats_updated = True
+        self.action_log = None
+        self.action_stats = None
+        self.persistence = None
+        if role == "ingest":
+            return
+
+        with self.startup.phase("action stats"):
+            self.action_log = stats.get_action_log()
+            if not self.action_log.exists() and os.path.exists(lc_config["payloads_file"]):
+                migrate_pickle(lc_config["payloads_file"], self.action_log)
+            self.action_stats = ActionStats.load(lc_config.get("stats_checkpoint", "action_stats.json"))
+            self.action_stats.catch_up(self.action_log)
+
+        # Firestore is only connected to when the first mod action is written.
+        self.persistence = PersistenceWorker(self.action_log, db_factory=firebase.get_db,
+                                             spool_path=lc_config.get("firestore_spool", "mod_actions.spool"))
+        self.persistence.listeners.append(self.on_action_persisted)
+
+    def add_cog(self, cog: commands.Cog):
+        super().add_cog(cog)
+        self.commands_version += 1
+
+    def remove_cog(self, name: str):
+        super().remove_cog(name)
+        self.commands_version += 1
+
+    def add_command(self, command: commands.Command):
+        super().add_command(command)
+        self.commands_version += 1
+
+    def remove_command(self, name: str) -> Optional[commands.Command]:
+        command = super().remove_command(name)
+        self.commands_version += 1
+        return command
+
+    def save_stats_checkpoint(self):
+        if not self.action_stats:
+            return
+        try:
+            self.action_stats.save(lc_config.get("stats_checkpoint", "action_stats.json"))
+        except Exception as e:
+            print(f"Error saving stats checkpoint: {e}")
+
+    def on_action_persisted(self, payload: Dict[str, Any], position: int):
+        if self.action_stats.record(get_item_type(payload), payload["user"], position + 1, get_timestamp(payload)):
+            self.stats_updated = True
+
+    def snapshot_state(self) -> Dict[str, Any]:
+        state = dict()
+        if self.role != "gateway":
+            state["streams"] = {str(sub): dump_streams(sub, self.seen_items) for sub in self.subreddits}
+        if self.role != "ingest":
+            state["messages"] = list()
+            for age, message, item in self.item_cache.entries():
+                data = dump_cached_item(item)
+                if data:
+                    state["messages"].append((message.channel.id, message.id, age, data))
+            state["confirmations"] = list(self.pending_confirmations.values())
+        return state
+
+    def save_warm_state(self):
+        # Until the snapshot has been restored there is nothing in memory that's worth overwriting it with.
+        if not self.warm_state_loaded:
+            return
+        try:
+            self.warm_state.save(self.snapshot_state())
+        except Exception as e:
+            print(f"Error saving warm state: {e}")
+
+    def restore_warm_state(self):
+        if self.warm_state_loaded:
+            return
+        self.warm_state_loaded = True
+
+        with self.startup.phase("warm state"):
+            state = self.warm_state.load()
+            if not state:
+                return
+
+            if self.role != "gateway" and not self.warm_state.is_stale(state):
+                for sub in self.subreddits:
+                    load_streams(sub, state.get("streams", {}).get(str(sub), {}), self.seen_items)
+
+            if self.role != "ingest":
+                load = functools.partial(load_item, self.reddit, self.subreddits)
+                for channel_id, message_id, age, data in state.get("messages", []):
+                    channel = self.get_channel(channel_id)
+                    if channel:
+                        self.item_cache.put(channel.get_partial_message(message_id), RestoredItem(data, load), age)
+                for confirmation in state.get("confirmations", []):
+                    if confirmation[5] > time.time():
+                        self.loop.create_task(self.resume_confirmation(*confirmation))
+
+    def start_warm_state_saver(self):
+        if self._warm_state_saver is None or self._warm_state_saver.done():
+            self._warm_state_saver = self.loop.create_task(self.save_warm_state_periodically())
+
+    async def save_warm_state_periodically(self):
+        while True:
+            await asyncio.sleep(lc_config.get("warm_state_interval", 60.0))
+            self.save_warm_state()
+
+    def role_path(self, path: str, role: Optional[str] = None) -> str:
+        role = role or self.role
+        if role == "single":
+            return path
+        root, ext = os.path.splitext(path)
+        return f"{root}.{role}{ext}"
+
+    def collect_metrics(self):
+        stats_sources = {
+            "persistence": self.persistence,
+            "item_cache": self.item_cache,
+            "info_batcher": self.info_batcher,
+            "reaction_attacher": self.reaction_attacher,
+            "warm_state": self.warm_state,
+            "reddit_cache": self.reddit_cache,
+            "word_scanner": self.word_scanner
+        }
+        for prefix, source in stats_sources.items():
+            if source is None:
+                continue
+            for name, value in source.stats().items():
+                if isinstance(value, (int, float)):
+                    metrics.set(f"{prefix}.{name}", value)
+        metrics.set("dispatcher.pending", sum(q["pending"] for q in self.dispatcher.stats().values()))
+        metrics.set("render_jobs.pending", self.jobs.qsize())
+
+    def run_in_background(self, coro) -> asyncio.Task:
+        task = self.loop.create_task(coro)
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+        return task
+
+    def start_metrics_exporter(self):
+        if self._metrics_exporter is None or self._metrics_exporter.done():
+            self._metrics_exporter = self.loop.create_task(self.export_metrics_periodically())
+
+    async def export_metrics_periodically(self):
+        # The ingest process loads no cogs, so it writes its own metrics where the gateway's !perf can read them.
+        while True:
+            await asyncio.sleep(lc_config.get("metrics_interval", 60.0))
+            try:
+                self.collect_metrics()
+                metrics.write_prometheus(self.role_path(lc_config.get("metrics_file", "metrics.prom")))
+                metrics.write_summary(self.role_path(lc_config.get("metrics_summary_file", "metrics.json")))
+            except Exception as e:
+                print(f"Error exporting metrics: {e}")
+
+    def load_word_matcher(self, languages: Iterable[str]) -> Tuple[WordMatcher, str]:
+        languages = list(languages)
+        return load_artifact(lc_config.get("word_list") or word_list_path(languages), languages,
+                             lc_config.get("word_artifacts", "assets/compiled"))
+
+    async def reload_word_matcher(self, languages: Optional[Iterable[str]] = None) -> Tuple[WordMatcher, str]:
+        languages = list(languages or self.word_languages)
+        # Building a large list takes a while, so it happens off the event loop and comments keep being scanned.
+        matcher, key = await self.loop.run_in_executor(None, self.load_word_matcher, languages)
+        self.word_matcher, self.word_list_key, self.word_languages = matcher, key, languages
+        self.word_scanner.swap(matcher)
+        metrics.inc("word_list.reloads")
+        return matcher, key
+
+    def start_word_list_watcher(self):
+        if self._word_list_watcher is None or self._word_list_watcher.done():
+            self._word_list_watcher = self.loop.create_task(self.watch_word_list())
+
+    async def watch_word_list(self):
+        # Picks up edits to the word list without a command, which is also how a split ingest process hears of them.
+        while True:
+            await asyncio.sleep(lc_config.get("word_list_check_interval", 60.0))
+            try:
+                source = lc_config.get("word_list") or word_list_path(self.word_languages)
+                if artifact_key(source, self.word_languages) != self.word_list_key:
+                    matcher, key = await self.reload_word_matcher()
+                    print(f"Reloaded {len(matcher)} words from word list {key}.")
+            except Exception as e:
+                print(f"Error reloading word list: {e}")
+
+    async def close(self):
+        # Intake stops first, then everything already taken in is drained. The warm state is saved last, so none of
+        # the items it marks as seen are still waiting to be posted.
+        for task in (self._poller, self._word_list_watcher, self._warm_state_saver, self._metrics_exporter):
+            if task:
+                task.cancel()
+        self._poller = self._word_list_watcher = self._warm_state_saver = self._metrics_exporter = None
+        if self.ingest_process is not None:
+            await self.stop_ingest()
+
+        timeout = lc_config.get("shutdown_timeout", 10.0)
+        if self.background_tasks:
+            await asyncio.wait(self.background_tasks, timeout=timeout)
+        if self._job_consumer:
+            try:
+                await asyncio.wait_for(self.jobs.join(), timeout)
+            except asyncio.TimeoutError:
+                print(f"Dropping {self.jobs.qsize()} render jobs that weren't sent before shutting down.")
+            self._job_consumer.cancel()
+            self._job_consumer = None
+
+        await self.dispatcher.stop()
+        await self.reaction_attacher.stop()
+        if self.persistence:
+            await self.persistence.stop()
+        self.word_scanner.stop()
+        self.info_batcher.stop()
+        self.jobs.close()
+        self.save_stats_checkpoint()
+        if self.action_log:
+            self.action_log.close()
+        if self.seen_items:
+            self.seen_items.close()
+        self.save_warm_state()
+        await super().close()
+
+    async def stop_ingest(self):
+        # The ingest process stops polling and hands over its last jobs while this process is still consuming them,
+        # so the queue only drains once nothing else can be put on it.
+        self.ingest_stop.set()
+        await self.loop.run_in_executor(None, self.ingest_process.join, lc_config.get("ingest_stop_timeout", 30.0))
+        if self.ingest_process.is_alive():
+            print("The ingest process didn't stop in time.")
 
     async def on_command_error(self, ctx: commands.Context, error):
         if isinstance(error, discord.ext.commands.errors.CommandNotFound):
             pass
         else:
+            metrics.inc("command_errors")
             print(f"Error in command: {error}")
 
     async def on_handler_error(self, error):
+        metrics.inc("handler_errors")
         print(f"Error in handler: {error}")
 
-    async def on_ready(self):
-        print(f"{self.user} is running.")
+    async def load_subreddits(self):
+        with self.startup.phase("subreddits"):
+            subreddits = [Subreddit(self, **sub) for sub in lc_config["subreddits"]]
+            results = await asyncio.gather(*(s.load_reactions() for s in subreddits), return_exceptions=True)
+            for s, result in zip(subreddits, results):
+                if isinstance(result, Exception):
+                    print(f"Error loading reactions for {s}: {result}")
+            await self.add_subreddits(*subreddits)
+
+    async def ingest(self):
+        # The ingest process never connects to Discord, it only polls Reddit and hands render jobs to the gateway.
+        await self.load_subreddits()
+        self.restore_warm_state()
+        self.start_warm_state_saver()
+        self.start_metrics_exporter()
+        self.start_word_list_watcher()
+        self.start_polling()
+        if self.startup.mark("polling"):
+            print(self.startup.report())
+        if self.ingest_stop is None:
+            await self.loop.create_future()
+        while not self.ingest_stop.is_set():
+            await asyncio.sleep(lc_config.get("ingest_stop_interval", 0.5))
+
+    def start_polling(self):
+        # Banhammer.start doesn't keep its poll task, which close() needs to stop intake before draining the rest.
+        # on_ready also fires again after reconnects, which would otherwise start a second poller.
+        if self._poller is None or self._poller.done():
+            self._poller = self.loop.create_task(self.send_items())
+
+    def start_job_consumer(self):
+        if self._job_consumer is None or self._job_consumer.done():
+            self._job_consumer = self.loop.create_task(self.consume_jobs())
+
+    async def consume_jobs(self):
+        while True:
+            job = await self.jobs.get()
+            try:
+                await self.render_job(job)
+            except Exception as e:
+                print(f"Error rendering job for {job.channel}: {e}")
+            finally:
+                self.jobs.task_done()
 
-        for sub in lc_config["subreddits"]:
-            s = Subreddit(self, **sub)
-            await s.load_reactions()
-            await self.add_subreddits(s)
+    async def render_job(self, job: RenderJob):
+        item = job.item or load_item(self.reddit, self.subreddits, job.item_data)
+        embed = discord.Embed.from_dict(job.embed)
+        embed.set_footer(text="Lester Crest Bot", icon_url=self.user.avatar_url)
 
-        channel = self.get_channel(734713971428425729)
-        message = await channel.fetch_message(736613065889546321)
+        async def on_sent(msg: discord.Message):
+            if item:
+                self.item_cache.put(msg, item)
+            self.reaction_attacher.attach(msg, job.reactions)
 
-        for sub in self.subreddits:
-            embed = await sub.get_reactions_embed(embed_template=self.embed)
-            try:
-                await message.edit(embed=embed)
-            except Exception as e:
-                print(f"Error setting subreddit reactions embed: {e}")
-            break
+        metrics.observe("render_job.queued", time.time() - job.created)
+        await self.dispatcher.send(self.get_channel(lc_config[job.channel]), on_sent=on_sent, embed=embed)
 
-        Banhammer.start(self)
+    async def on_ready(self):
+        print(f"{self.user} is running.")
+        self.startup.mark("ready")
+
+        await self.load_subreddits()
+
+        with self.startup.phase("reactions embed"):
+            channel = self.get_channel(734713971428425729)
+            message = await channel.fetch_message(736613065889546321)
+
+            for sub in self.subreddits:
+                embed = await sub.get_reactions_embed(embed_template=self.embed)
+                try:
+                    await message.edit(embed=embed)
+                except Exception as e:
+                    print(f"Error setting subreddit reactions embed: {e}")
+                break
+
+        self.restore_warm_state()
+        self.start_warm_state_saver()
+        self.start_job_consumer()
+        if self.role == "single":
+            self.start_word_list_watcher()
+            self.start_polling()
+            if self.startup.mark("polling"):
+                print(self.startup.report())
 
     async def on_message(self, message: discord.Message):
         if message.author.bot:
@@ -94,10 +464,18 @@ class LesterCrest(Bot, Banhammer):
 
         item = await self.get_item(message.content)
         if item:
-            await item.add_reactions(message)
+            self.reaction_attacher.attach(message, [r.emoji for r in item.reactions])
 
         await self.process_commands(message)
 
+    async def refresh_item(self, item: RedditItem) -> RedditItem:
+        # apraw's fetch() can't update comments in place and keeps the listing wrapper as a submission's data,
+        # so the item is rebuilt from a fresh /api/info lookup instead.
+        async for thing in self.reddit.info(ids=[item.item.fullname]):
+            return RedditItem(thing, item.subreddit, item.source)
+        return item
+
+    @metrics.timed("reaction")
     async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
         c = self.get_channel(payload.channel_id)
 
@@ -110,19 +488,30 @@ class LesterCrest(Bot, Banhammer):
         if not any(role.id == 734714209342062602 for role in u.roles):
             return
 
-        try:
-            m = await c.fetch_message(payload.message_id)
-        except Exception as e:
-            print(f"Error fetching message: {e}")
-            return
-
-        e = payload.emoji.is_custom_emoji() and f"<:{payload.emoji.name}:{payload.emoji.id}>" or payload.emoji.name
+        emoji = payload.emoji.is_custom_emoji() and f"<:{payload.emoji.name}:{payload.emoji.id}>" or payload.emoji.name
+
+        with metrics.span("reaction.lookup"):
+            cached = self.item_cache.get(payload.message_id)
+            if cached:
+                m, item = cached
+                if item.type in ["submission", "comment"]:
+                    try:
+                        item = await self.refresh_item(item)
+                    except Exception as e:
+                        print(f"Error refreshing cached item: {e}")
+            else:
+                try:
+                    m = await c.fetch_message(payload.message_id)
+                except Exception as e:
+                    print(f"Error fetching message: {e}")
+                    return
 
-        item = await self.get_item(m.embeds[0] if m.embeds else m.content)
-        if not item:
-            return
+                item = await self.get_item(m.embeds[0] if m.embeds else m.content)
+                if not item:
+                    return
+                self.item_cache.put(m, item)
 
-        reaction = item.get_reaction(e)
+        reaction = item.get_reaction(emoji)
 
         if not reaction:
             return
@@ -143,131 +532,247 @@ class LesterCrest(Bot, Banhammer):
 
         if msg:
             msg = await u.send(msg)
-            await msg.add_reaction("✔")
-            await msg.add_reaction("❌")
+            self.reaction_attacher.attach(msg, ("✔", "❌"))
 
+            self.pending_confirmations[msg.id] = (msg.id, u.id, c.id, m.id, emoji, time.time() + CONFIRMATION_TIMEOUT,
+                                                  dump_cached_item(item))
             try:
-                r = await self.wait_for("reaction_add",
-                                        check=lambda _r, _u: _u.id == u.id and _r.message.id == msg.id,
-                                        timeout=2 * 60)
-                await msg.delete()
-
-                if r[0].emoji != "✔":
+                if not await self.wait_for_confirmation(u, msg, CONFIRMATION_TIMEOUT):
                     return
-            except asyncio.exceptions.TimeoutError:
-                await u.send("❌ That took too long! You can restart the process by reacting to the item again.")
+            finally:
+                self.pending_confirmations.pop(msg.id, None)
+
+        await self.handle_reaction(u, m, item, reaction)
+
+    async def wait_for_confirmation(self, u: discord.Member, msg: discord.Message, timeout: float) -> bool:
+        # Raw events also arrive for DMs sent before a restart, which aren't in the message cache.
+        try:
+            payload = await self.wait_for("raw_reaction_add",
+                                          check=lambda p: p.user_id == u.id and p.message_id == msg.id,
+                                          timeout=timeout)
+            await msg.delete()
+            return payload.emoji.name == "✔"
+        except asyncio.exceptions.TimeoutError:
+            await u.send("❌ That took too long! You can restart the process by reacting to the item again.")
+            return False
+
+    async def resume_confirmation(self, dm_id: int, user_id: int, channel_id: int, message_id: int, emoji: str,
+                                  deadline: float, data: Optional[Dict[str, Any]]):
+        c = self.get_channel(channel_id)
+        u = c.guild.get_member(user_id) if c else None
+        item = load_item(self.reddit, self.subreddits, data)
+        reaction = item.get_reaction(emoji) if item else None
+        if not (u and reaction):
+            return
+
+        self.pending_confirmations[dm_id] = (dm_id, user_id, channel_id, message_id, emoji, deadline, data)
+        try:
+            dm = u.dm_channel or await u.create_dm()
+            if not await self.wait_for_confirmation(u, dm.get_partial_message(dm_id), deadline - time.time()):
                 return
+            try:
+                item = await self.refresh_item(item)
+            except Exception as e:
+                print(f"Error refreshing restored item: {e}")
+            await self.handle_reaction(u, c.get_partial_message(message_id), item, reaction)
+        except Exception as e:
+            print(f"Error resuming confirmation {dm_id}: {e}")
+        finally:
+            self.pending_confirmations.pop(dm_id, None)
 
-        result = await reaction.handle(item, user=u.nick)
+    async def handle_reaction(self, u: discord.Member, m: discord.Message, item: RedditItem, reaction: Reaction):
+        with metrics.span("reaction.handle"):
+            # Members without a server nickname have none, so their username is used instead.
+            result = await reaction.handle(item, user=u.nick or u.name)
+        metrics.inc(f"reactions.{'approved' if result.approved else 'removed'}")
 
         try:
             await m.delete()
         except Exception as e:
             print(f"Failed to delete message: {e}")
             return
-
-        if result.approved:
-            channel = self.get_channel(lc_config["approved_channel"])
-            message = await channel.send(embed=await result.get_embed(embed_template=self.embed))
-        elif any("banned" in action for action in result.actions):
-            channel = self.get_channel(lc_config["banned_channel"])
-            message = await channel.send(embed=await result.get_embed(embed_template=self.embed))
-        else:
-            channel = self.get_channel(lc_config["removed_channel"])
-            message = await channel.send(embed=await result.get_embed(embed_template=self.embed))
-
-            if not await item.is_author_removed():
-                for reaction in item.reactions:
-                    if reaction.ban is not None:
-                        await message.add_reaction(reaction.emoji)
-
-        if item.type in ["submission", "comment"]:
-            self.stats_updated = True
-            self.action_stats[f"{item.type}s"][result.user] = self.action_stats[f"{item.type}s"].get(
-                result.user, 0) + 1
-
-        d = await result.to_dict()
-        with open(lc_config["payloads_file"], "ab+") as f:
-            pickle.dump(d, f)
-        firebase.db.collection("mod_actions").add(d)
+        finally:
+            self.item_cache.pop(m.id)
+
+        with metrics.span("reaction.post"):
+            if result.approved:
+                channel = self.get_channel(lc_config["approved_channel"])
+                message = await channel.send(embed=await result.get_embed(embed_template=self.embed))
+            elif any("banned" in action for action in result.actions):
+                channel = self.get_channel(lc_config["banned_channel"])
+                message = await channel.send(embed=await result.get_embed(embed_template=self.embed))
+            else:
+                channel = self.get_channel(lc_config["removed_channel"])
+                message = await channel.send(embed=await result.get_embed(embed_template=self.embed))
+
+                if not await item.is_author_removed():
+                    self.item_cache.put(message, item)
+                    self.reaction_attacher.attach(message, [r.emoji for r in item.reactions if r.ban is not None])
+
+        with metrics.span("reaction.persist"):
+            await self.persistence.put(await result.to_dict())
+
+    async def post_item(self, channel: str, item: RedditItem, embed: discord.Embed):
+        if self.startup.mark("first item"):
+            print(self.startup.report())
+
+        metrics.inc(f"posted.{channel}")
+        with metrics.span("post_item.enqueue"):
+            # Every item goes through a render job, whether the gateway runs in this process or another one.
+            await self.jobs.put(RenderJob.from_item(channel, item, embed))
 
     @property
     def embed(self):
         embed = discord.Embed(colour=gta_green)
-        embed.set_footer(text="Lester Crest Bot", icon_url=self.user.avatar_url)
+        # The ingest process has no Discord user, render_job sets the footer icon once the job reaches the gateway.
+        embed.set_footer(text="Lester Crest Bot", icon_url=self.user.avatar_url if self.user else discord.Embed.Empty)
         embed.timestamp = datetime.utcnow()
         return embed
 
     @EventHandler.new()
+    @metrics.timed("handle_new")
     async def handle_new(self, item: RedditItem):
-        self._new_ids.add(item.item.id)
+        self.seen_items.add(item.item.id, "new")
         embed = await item.get_embed(embed_template=self.embed)
-        msg = await self.get_channel(lc_config["new_channel"]).send(embed=embed)
-        await item.add_reactions(msg)
+        await self.post_item("new_channel", item, embed)
 
     @EventHandler.comments()
     @EventHandler.filter(ItemAttribute.AUTHOR, "automoderator", "lestercrestbot", "repostsleuthbot", reverse=True)
+    @metrics.timed("handle_comments")
     async def handle_comments(self, item: RedditItem):
-        self._comment_ids.add(item.item.id)
-        embed = await item.get_embed(embed_template=self.embed)
-        msg = await self.get_channel(lc_config["comments_channel"]).send(embed=embed)
-        await item.add_reactions(msg)
+        self.seen_items.add(item.item.id, "comments")
+        # The scan runs in the worker pool while the embed is built and posted, and Banhammer doesn't wait on it.
+        scan = self.word_scanner.submit(item.body)
 
-        if any(pattern.search(item.body.lower()) for pattern in self.word_patterns):
-            msg = await self.get_channel(lc_config["no_no_words_channel"]).send(embed=embed)
-            await item.add_reactions(msg)
+        with metrics.span("handle_comments.embed"):
+            embed = await item.get_embed(embed_template=self.embed)
+        await self.post_item("comments_channel", item, embed)
+        self.run_in_background(self.post_word_match(item, embed, scan))
+
+    async def post_word_match(self, item: RedditItem, embed: discord.Embed, scan: asyncio.Future):
+        try:
+            with metrics.span("handle_comments.word_scan"):
+                matched = await scan
+            if matched:
+                await self.post_item("no_no_words_channel", item, embed)
+        except Exception as e:
+            await self.on_handler_error(e)
 
     @EventHandler.comments()
     @EventHandler.filter(ItemAttribute.AUTHOR, "repostsleuthbot")
+    @metrics.timed("handle_reposts")
     async def handle_reposts(self, item: RedditItem):
-        self._comment_ids.add(item.item.id)
-        try:
+        self.seen_items.add(item.item.id, "comments")
+
+        async def load_submission():
             submission = await item.item.submission()
+            submission_item = RedditItem(submission, item.subreddit, "reports")
+            embed = await submission_item.get_embed(embed_template=self.embed)
+            return submission_item, embed.to_dict()
+
+        # Without a link id there's no key to share, so the submission is fetched without the cache.
+        submission_id = item.item._data.get("link_id")
+        try:
+            if submission_id:
+                submission_item, embed_data = await self.reddit_cache.get(("submission", submission_id),
+                                                                          load_submission)
+            else:
+                submission_item, embed_data = await load_submission()
         except Exception as e:
             print(f"Couldn't fetch comment's parent submission: {e}")
         else:
-            submission_item = RedditItem(submission, item.subreddit, "reports")
-            embed = await submission_item.get_embed(embed_template=self.embed)
+            # The cached embed keeps the submission's own timestamp.
+            embed = discord.Embed.from_dict(embed_data)
 
             embed.add_field(name="Comment by /u/RepostSleuthBot",
                             value=f"{item.body}\n\n[Comment.]({item.url})")
 
-            msg = await self.get_channel(lc_config["reposts_channel"]).send(embed=embed)
-            await submission_item.add_reactions(msg)
+            await self.post_item("reposts_channel", submission_item, embed)
 
     @EventHandler.mail()
+    @metrics.timed("handle_mail")
     async def handle_mail(self, item: RedditItem):
+        self.seen_items.add(item.item.id, "mail")
         embed = await item.get_embed(embed_template=self.embed)
-        msg = await self.get_channel(lc_config["mail_channel"]).send(embed=embed)
-        await item.add_reactions(msg)
+        await self.post_item("mail_channel", item, embed)
 
     @EventHandler.reports()
+    @metrics.timed("handle_reports")
     async def handle_reports(self, item: RedditItem):
-        self._report_ids.add(item.item.id)
-        embed = await item.get_embed(embed_template=self.embed)
-        msg = await self.get_channel(lc_config["reports_channel"]).send(embed=embed)
-        await item.add_reactions(msg)
+        self.seen_items.add(item.item.id, "reports")
+        if item.type in ["submission", "comment"]:
+            # Banhammer awaits handlers one at a time, so reports are posted from tasks to let refreshes batch up.
+            # Once enough of them are in flight the handler waits, which holds back the next poll.
+            if self._report_slots is None:
+                self._report_slots = asyncio.Semaphore(lc_config.get("report_concurrency", 16))
+            received = time.monotonic()
+            await self._report_slots.acquire()
+            self.run_in_background(self.post_report(item, received))
+        else:
+            embed = await item.get_embed(embed_template=self.embed)
+            await self.post_item("reports_channel", item, embed)
+
+    async def post_report(self, item: RedditItem, received: float):
+        try:
+            # The listing already has the score, it's only fetched again if the report sat around long enough to age.
+            if "score" not in item.item._data or \
+                    time.monotonic() - received > lc_config.get("report_refresh_age", 30.0):
+                with metrics.span("handle_reports.refresh"):
+                    await self.info_batcher.refresh(item.item.fullname)
+            embed = await item.get_embed(embed_template=self.embed)
+            await self.post_item("reports_channel", item, embed)
+        except Exception as e:
+            await self.on_handler_error(e)
+        finally:
+            self._report_slots.release()
 
     @EventHandler.queue()
+    @metrics.timed("handle_queue")
     async def handle_queue(self, item: RedditItem):
-        if any(item.item.id in ids for ids in (self._new_ids, self._comment_ids, self._report_ids)):
+        self.seen_items.add(item.item.id, "queue")
+        if self.seen_items.contains(item.item.id, "new", "comments", "reports"):
             return
         embed = await item.get_embed(embed_template=self.embed)
-        msg = await self.get_channel(lc_config["queue_channel"]).send(embed=embed)
-        await item.add_reactions(msg)
+        await self.post_item("queue_channel", item, embed)
 
     @EventHandler.mod_actions()
+    @metrics.timed("handle_actions")
     async def handle_actions(self, item: RedditItem):
+        self.seen_items.add(item.item.id, "mod_actions")
         embed = await item.get_embed(embed_template=self.embed)
-        msg = await self.get_channel(lc_config["actions_channel"]).send(embed=embed)
-        await item.add_reactions(msg)
+        await self.post_item("actions_channel", item, embed)
 
 
 extensions = ["cogs.mod_cog"]
 
 
+def run_ingest(jobs: Any, stop: Any):
+    bot = LesterCrest(role="ingest", jobs=jobs, ingest_stop=stop)
+    try:
+        bot.loop.run_until_complete(bot.ingest())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        bot.loop.run_until_complete(bot.close())
+
+
 if __name__ == "__main__":
-    bot = LesterCrest()
+    parser = argparse.ArgumentParser(description="Run Lester Crest Bot.")
+    parser.add_argument("--split", action="store_true",
+                        help="Poll Reddit and render items in a separate process from the Discord gateway.")
+    args = parser.parse_args()
+
+    if args.split:
+        context = multiprocessing.get_context("spawn")
+        # The queue is bounded, so the ingest process waits on the gateway when Discord falls behind.
+        jobs = context.Queue(lc_config.get("render_queue_size", 500))
+        stop = context.Event()
+        ingest = context.Process(target=run_ingest, args=(jobs, stop), name="lcb-ingest")
+        ingest.start()
+        bot = LesterCrest(role="gateway", jobs=jobs, ingest_stop=stop, ingest_process=ingest)
+    else:
+        ingest = None
+        bot = LesterCrest()
 
     for extension in extensions:
         bot.load_extension(extension)
@@ -276,4 +781,12 @@ if __name__ == "__main__":
     config = configparser.ConfigParser()
     config.read("discord.ini")
 
-    bot.run(config["LCB"]["token"])
+    try:
+        bot.run(config["LCB"]["token"])
+    finally:
+        # close() normally stops ingest already, this covers the gateway failing before it got that far.
+        if ingest:
+            stop.set()
+            ingest.join(lc_config.get("ingest_stop_timeout", 30.0))
+            if ingest.is_alive():
+                ingest.terminate()
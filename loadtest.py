@@ -0,0 +1,614 @@
+import argparse
+import asyncio
+import contextlib
+import contextvars
+import itertools
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import apraw
+import discord
+from apraw.endpoints import API_PATH
+from apraw.models import Comment, ItemModeration, ModAction, ModmailConversation, ModmailMessage, Submission
+from apraw.models import Subreddit as RedditSubreddit
+from banhammer.models import RedditItem, Subreddit
+
+from config import config as lc_config
+from helpers.metrics import Histogram, metrics
+from helpers.render_jobs import RenderJob
+from lester import LesterCrest
+
+SOURCES = ("new", "comments", "reports", "queue", "mail", "mod_actions")
+DEFAULT_MIX = "new=20,comments=50,reports=10,queue=10,mail=5,mod_actions=5"
+
+# The source Banhammer's generators label items from each stream with.
+ITEM_SOURCES = {
+    "new": "new",
+    "comments": "new",
+    "reports": "reports",
+    "queue": "queue",
+    "mail": "modmail",
+    "mod_actions": "log"
+}
+
+CHANNELS = ("new_channel", "comments_channel", "reports_channel", "mail_channel", "queue_channel",
+            "reposts_channel", "no_no_words_channel", "actions_channel", "approved_channel", "removed_channel",
+            "banned_channel")
+FEED_CHANNELS = CHANNELS[:8]
+
+MOD_ROLE = 734714209342062602
+MOD_ACTIONS = ("removelink", "approvelink", "removecomment", "approvecomment", "lock", "editflair", "spamlink")
+
+_ingested: contextvars.ContextVar = contextvars.ContextVar("ingested")
+
+
+def _listing(children: Iterable[Tuple[str, Dict[str, Any]]]) -> Dict[str, Any]:
+    # apraw updates the dicts it's given, so every response gets its own copy.
+    return {"kind": "Listing", "data": {"children": [{"kind": kind, "data": dict(data)} for kind, data in children]}}
+
+
+# apraw's ItemModeration.fullname returns itself and recurses forever, so mod actions on items could never be sent.
+ItemModeration.fullname = property(lambda self: self._item.fullname)
+
+
+class FakeReddit(apraw.Reddit):
+
+    def __init__(self, latency: float = 0.0):
+        # No requests leave the process, so the credentials only need to pass apraw's checks.
+        super().__init__(username="LesterCrestBot", password="loadtest", client_id="loadtest",
+                         client_secret="loadtest", user_agent="LesterCrestBot load test")
+        self.latency = latency
+        self.things: Dict[str, Tuple[str, Dict[str, Any]]] = dict()
+        self.conversations: Dict[str, Dict[str, Any]] = dict()
+        self.requests = 0
+
+    def add(self, kind: str, data: Dict[str, Any]):
+        # Fetches are answered in Reddit's wire format, whatever the item handed to the bot was built from.
+        if isinstance(data.get("created_utc"), datetime):
+            data = {**data, "created_utc": data["created_utc"].replace(tzinfo=timezone.utc).timestamp()}
+        self.things[f"{kind}_{data['id']}"] = (kind, data)
+
+    async def _respond(self):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(random.uniform(0.5, 1.5) * self.latency)
+
+    async def get(self, endpoint: str, **params) -> Any:
+        await self._respond()
+        parts = endpoint.strip("/").split("/")
+
+        if endpoint == API_PATH["info"]:
+            return _listing(self.things[i] for i in params.get("id", "").split(",") if i in self.things)
+        elif parts[0] == "r" and len(parts) >= 4 and parts[2] == "comments":
+            submission = self.things[f"{self.link_kind}_{parts[3]}"]
+            comments = [self.things[f"{self.comment_kind}_{parts[5]}"]] if len(parts) >= 6 else []
+            return [_listing([submission]), _listing(comments)]
+        elif parts[0] == "r" and parts[2:] == ["about"]:
+            return {"kind": self.subreddit_kind, "data": {"display_name": parts[1], "community_icon": ""}}
+        elif parts[0] == "user" and parts[2:] == ["about"]:
+            return {"kind": self.account_kind, "data": {"name": parts[1], "id": parts[1].lower()}}
+        elif endpoint.startswith("/api/mod/conversations/"):
+            return {"conversation": dict(self.conversations[parts[3]]), "messages": {}}
+
+        raise ValueError(f"The load test has no response for {endpoint}.")
+
+    async def post(self, *args, **kwargs) -> Any:
+        await self._respond()
+        return {}
+
+
+class FakeFirestore:
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.documents: Dict[Tuple[str, str], Dict[str, Any]] = dict()
+        self.commits = 0
+        self._lock = threading.Lock()
+
+    def collection(self, name: str) -> '_FakeCollection':
+        return _FakeCollection(name)
+
+    def batch(self) -> '_FakeBatch':
+        return _FakeBatch(self)
+
+
+class _FakeCollection:
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def document(self, id: str) -> Tuple[str, str]:
+        return self.name, id
+
+
+class _FakeBatch:
+
+    def __init__(self, db: FakeFirestore):
+        self.db = db
+        self.writes: List[Tuple[Tuple[str, str], Dict[str, Any]]] = list()
+
+    def set(self, ref: Tuple[str, str], data: Dict[str, Any]):
+        self.writes.append((ref, data))
+
+    def commit(self):
+        # Commits run in the persistence worker's executor, so the latency blocks a thread like the real client.
+        time.sleep(self.db.latency)
+        with self.db._lock:
+            self.db.documents.update(self.writes)
+            self.db.commits += 1
+
+
+class FakeMessage:
+
+    def __init__(self, channel: 'FakeChannel', id: int, content: Optional[str] = None,
+                 embed: Optional[discord.Embed] = None):
+        self.channel = channel
+        self.id = id
+        self.content = content or ""
+        self.embeds = [embed] if embed else []
+        self.reactions: List[str] = list()
+
+    async def add_reaction(self, emoji: Any):
+        await self.channel.harness.discord_call()
+        self.reactions.append(str(emoji))
+
+    async def edit(self, content: Optional[str] = None, embed: Optional[discord.Embed] = None, **kwargs):
+        await self.channel.harness.discord_call()
+        self.content = content or self.content
+        self.embeds = [embed] if embed else self.embeds
+
+    async def delete(self):
+        await self.channel.harness.discord_call()
+        self.channel.messages.pop(self.id, None)
+
+
+class FakeChannel(discord.TextChannel):
+
+    def __init__(self, harness: 'LoadTest', id: int, name: str, guild: 'FakeGuild'):
+        self.harness = harness
+        self.id = id
+        self.name = name
+        self.guild = guild
+        self.messages: Dict[int, FakeMessage] = dict()
+        self.sent = 0
+
+    def __repr__(self):
+        return f"<FakeChannel id={self.id} name={self.name!r}>"
+
+    async def send(self, content: Optional[str] = None, *, embed: Optional[discord.Embed] = None, **kwargs):
+        await self.harness.discord_call()
+        message = FakeMessage(self, next(self.harness.message_ids), content, embed)
+        self.messages[message.id] = message
+        self.sent += 1
+        return message
+
+    async def fetch_message(self, id: int) -> FakeMessage:
+        await self.harness.discord_call()
+        return self.messages[id]
+
+
+class FakeMember:
+
+    def __init__(self, harness: 'LoadTest', id: int, nick: str):
+        self.harness = harness
+        self.id = id
+        self.nick = nick
+        self.name = nick
+        self.bot = False
+        self.roles = [discord.Object(MOD_ROLE)]
+
+    async def send(self, content: Optional[str] = None, **kwargs):
+        return await self.harness.direct_messages.send(content, **kwargs)
+
+
+class FakeGuild:
+
+    def __init__(self):
+        self.members: Dict[int, FakeMember] = dict()
+
+    def get_member(self, id: int) -> Optional[FakeMember]:
+        return self.members.get(id)
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    mix = dict()
+    for part in value.split(","):
+        source, _, weight = part.partition("=")
+        if source.strip() not in SOURCES:
+            raise argparse.ArgumentTypeError(f"Unknown source {source!r}, expected one of {', '.join(SOURCES)}.")
+        mix[source.strip()] = float(weight or 1)
+    return mix
+
+
+def synthetic_stream(count: int, mix: Dict[str, float], subreddit: str = "gtaonline", repost_rate: float = 0.05,
+                     dirty_rate: float = 0.05, seed: int = 0) -> Iterator[Dict[str, Any]]:
+    rng = random.Random(seed)
+    sources, weights = zip(*mix.items())
+    with open("assets/DirtyWords_en.txt", encoding="utf8") as f:
+        dirty_words = [line.strip() for line in f if line.strip()]
+
+    ids = itertools.count(10_000_000)
+    submissions: List[Dict[str, Any]] = list()
+    comments: List[Dict[str, Any]] = list()
+
+    def base36(n: int) -> str:
+        digits = ""
+        while n:
+            n, r = divmod(n, 36)
+            digits = "0123456789abcdefghijklmnopqrstuvwxyz"[r] + digits
+        return digits
+
+    def body() -> str:
+        words = [rng.choice(("heist", "grind", "cayo", "lobby", "payout", "glitch", "casino")) for _ in range(24)]
+        if rng.random() < dirty_rate:
+            words.insert(rng.randrange(len(words)), rng.choice(dirty_words))
+        return " ".join(words)
+
+    def submission() -> Dict[str, Any]:
+        id = base36(next(ids))
+        data = {
+            "id": id, "name": f"t3_{id}", "subreddit": subreddit, "author": f"user_{rng.randrange(5000)}",
+            "title": f"Load test submission {id}", "selftext": body(), "is_self": True,
+            "url": f"https://www.reddit.com/r/{subreddit}/comments/{id}", "link_flair_text": "Discussion",
+            "created_utc": time.time(), "score": rng.randrange(100), "locked": False, "approved_by": None,
+            "removed_by": None, "user_reports": [], "mod_reports": []
+        }
+        submissions.append(data)
+        del submissions[:-50]
+        return data
+
+    def comment(author: Optional[str] = None) -> Dict[str, Any]:
+        parent = rng.choice(submissions)
+        id = base36(next(ids))
+        data = {
+            "id": id, "name": f"t1_{id}", "subreddit": subreddit, "link_id": parent["name"],
+            "parent_id": parent["name"], "author": author or f"user_{rng.randrange(5000)}", "body": body(),
+            "created_utc": time.time(), "score": rng.randrange(100), "locked": False, "approved_by": None,
+            "removed_by": None, "replies": "", "user_reports": [], "mod_reports": []
+        }
+        comments.append(data)
+        del comments[:-50]
+        return data
+
+    for i in range(count):
+        source = rng.choices(sources, weights)[0]
+        if source == "new" or not submissions:
+            yield {"source": source, "kind": "t3", "data": submission()}
+        elif source == "comments":
+            author = "RepostSleuthBot" if rng.random() < repost_rate else None
+            yield {"source": source, "kind": "t1", "data": comment(author)}
+        elif source in ("reports", "queue"):
+            if source == "queue" and rng.random() < 0.5:
+                # Unseen items, since the queue handler skips anything the new or comment streams already posted.
+                data = submission() if rng.random() < 0.5 else comment()
+            elif rng.random() < 0.5 and comments:
+                data = rng.choice(comments)
+            else:
+                data = rng.choice(submissions)
+            if source == "reports":
+                data = {**data, "user_reports": [["Breaks the rules", rng.randrange(1, 4)]]}
+            yield {"source": source, "kind": data["name"][:2], "data": data}
+        elif source == "mail":
+            id, text = base36(next(ids)), body()
+            author = {"name": f"user_{rng.randrange(5000)}", "isDeleted": False}
+            yield {"source": source, "kind": "modmail", "data": {
+                "conversation": {"id": id, "subject": f"Load test conversation {id}", "lastUpdated": time.time(),
+                                 "authors": [author]},
+                "message": {"id": base36(next(ids)), "body": text, "bodyMarkdown": text, "author": author,
+                            "isInternal": False, "date": datetime.utcnow().isoformat() + "+00:00"}
+            }}
+        else:
+            yield {"source": source, "kind": "modaction", "data": {
+                "id": f"ModAction_{i}", "mod": f"mod_{rng.randrange(20)}", "action": rng.choice(MOD_ACTIONS),
+                "created_utc": time.time(), "subreddit": subreddit
+            }}
+
+
+def read_stream(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, encoding="utf8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+async def monitor_loop_lag(histogram: Histogram, interval: float = 0.01):
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        histogram.observe(time.perf_counter() - start - interval)
+
+
+class LoadTest:
+
+    def __init__(self, workdir: str, rate: float = 20.0, subreddit: str = "gtaonline", reddit_latency: float = 0.05,
+                 discord_latency: float = 0.05, firestore_latency: float = 0.05, reaction_rate: float = 0.1,
+                 reaction_delay: float = 1.0, discord_rate: Optional[int] = None, scanner_mode: str = "process"):
+        self.workdir = workdir
+        self.rate = rate
+        self.discord_latency = discord_latency
+        self.reaction_rate = reaction_rate
+        self.reaction_delay = reaction_delay
+
+        self.message_ids = itertools.count(900_000_000_000_000_000)
+        self.latency = Histogram(1_000_000)
+        self.loop_lag = Histogram(1_000_000)
+        self.ingest_lag = Histogram(1_000_000)
+        self.discord_calls = 0
+        self.sent = 0
+        self.reacted = 0
+        self.reaction_errors = 0
+        self._reactions: set = set()
+
+        lc_config.update({
+            "change_presence": False,
+            "command_prefix": lc_config.get("command_prefix", "!"),
+            "subreddits": [{"subreddit": subreddit}],
+            "actions_log": os.path.join(workdir, "actions"),
+            "payloads_file": os.path.join(workdir, "payloads.pickle"),
+            "seen_items_file": os.path.join(workdir, "seen_items.log"),
+            "stats_checkpoint": os.path.join(workdir, "action_stats.json"),
+            "firestore_spool": os.path.join(workdir, "mod_actions.spool"),
+            "inbox_cursor_file": os.path.join(workdir, "inbox_cursor.json"),
+            "warm_state_file": os.path.join(workdir, "warm_state.pickle"),
+            "word_artifacts": os.path.join(workdir, "words"),
+            "metrics_file": os.path.join(workdir, "metrics.prom"),
+            "metrics_summary_file": os.path.join(workdir, "metrics.json"),
+            "word_scanner_mode": scanner_mode,
+            **{name: 1000 + i for i, name in enumerate(CHANNELS)}
+        })
+
+        self.reddit = FakeReddit(reddit_latency)
+        self.firestore = FakeFirestore(firestore_latency)
+        self.bot = LesterCrest(self.reddit)
+        self.bot.persistence.db = self.firestore
+        if discord_rate:
+            self.bot.dispatcher.rate = discord_rate
+
+        self.guild = FakeGuild()
+        self.guild.members[1] = FakeMember(self, 1, "loadtest")
+        self.channels = {lc_config[name]: FakeChannel(self, lc_config[name], name, self.guild) for name in CHANNELS}
+        self.direct_messages = FakeChannel(self, 999, "direct messages", self.guild)
+        self.feed_channels = {lc_config[name] for name in FEED_CHANNELS}
+
+        self.bot.get_channel = self.channels.get
+        self.bot._connection.user = discord.Object(2)
+        self.bot._connection.user.avatar_url = "https://cdn.discordapp.com/embed/avatars/0.png"
+
+        self.subreddit = Subreddit(self.bot, subreddit=subreddit, custom_emotes=False)
+        self.subreddit._subreddit = RedditSubreddit(self.reddit, {"display_name": subreddit, "community_icon": ""})
+        self.bot.subreddits.append(self.subreddit)
+
+        self._job_ingested: Dict[RenderJob, float] = dict()
+        self._put_job = self.bot.jobs.put
+        self.bot.jobs.put = self.put_job
+        self._render_job = self.bot.render_job
+        self.bot.render_job = self.render_job
+        self._send = self.bot.dispatcher.send
+        self.bot.dispatcher.send = self.send
+        self.bot.start_job_consumer()
+
+    async def discord_call(self):
+        self.discord_calls += 1
+        if self.discord_latency:
+            await asyncio.sleep(random.uniform(0.5, 1.5) * self.discord_latency)
+
+    def build_item(self, record: Dict[str, Any]) -> RedditItem:
+        kind, data = record["kind"], record["data"]
+        if kind == "modmail":
+            conversation = ModmailConversation(self.reddit, dict(data["conversation"]), self.subreddit._subreddit)
+            self.reddit.conversations[conversation.id] = data["conversation"]
+            item = ModmailMessage(conversation, dict(data["message"]))
+        elif kind == "modaction":
+            item = ModAction(self.reddit, dict(data), self.subreddit._subreddit)
+        else:
+            self.reddit.add(kind, data)
+            cls = Submission if kind == self.reddit.link_kind else Comment
+            item = cls(self.reddit, dict(data))
+        return RedditItem(item, self.subreddit, ITEM_SOURCES[record["source"]])
+
+    async def put_job(self, job: RenderJob):
+        # Jobs are tagged with the ingest time of the item being handled, which follows report tasks too.
+        ingested = _ingested.get(None)
+        if ingested is not None:
+            self._job_ingested[job] = ingested
+        await self._put_job(job)
+
+    async def render_job(self, job: RenderJob):
+        _ingested.set(self._job_ingested.pop(job, None))
+        await self._render_job(job)
+
+    async def send(self, channel: discord.abc.Messageable, priority: Optional[int] = None, on_sent=None, **kwargs):
+        ingested = _ingested.get(None)
+
+        async def sent(message: FakeMessage):
+            if ingested is not None:
+                self.latency.observe(time.perf_counter() - ingested)
+            self.sent += 1
+            if on_sent:
+                await on_sent(message)
+            self.maybe_react(message)
+
+        return await self._send(channel, priority, on_sent=sent, **kwargs)
+
+    def maybe_react(self, message: FakeMessage):
+        if message.channel.id not in self.feed_channels or random.random() >= self.reaction_rate:
+            return
+        task = asyncio.get_event_loop().create_task(self.react(message))
+        self._reactions.add(task)
+        task.add_done_callback(self._reactions.discard)
+
+    async def react(self, message: FakeMessage):
+        await asyncio.sleep(self.reaction_delay)
+        # Reactions are attached in the background, so the mod picks from whatever is on the message by now.
+        emojis = [emoji for emoji in ("✔", "❌") if emoji in message.reactions]
+        if not emojis:
+            return
+        emoji = random.choice(emojis)
+        event = discord.RawReactionActionEvent({"message_id": message.id, "channel_id": message.channel.id,
+                                                "user_id": 1}, discord.PartialEmoji(name=emoji), "REACTION_ADD")
+        try:
+            await self.bot.on_raw_reaction_add(event)
+            self.reacted += 1
+        except Exception as e:
+            self.reaction_errors += 1
+            print(f"Error handling reaction: {e}")
+
+    def busy(self) -> bool:
+        return bool(self._reactions or self.bot.jobs.qsize() or self.bot.reaction_attacher.pending
+                    or any(q["pending"] for q in self.bot.dispatcher.stats().values())
+                    or self.bot.info_batcher.stats()["pending"] or self.bot.persistence.queue_depth
+                    or self.bot.word_scanner.queue_depth or self.bot.background_tasks)
+
+    async def run(self, records: Iterable[Dict[str, Any]], drain_timeout: float = 60.0) -> Dict[str, Any]:
+        lag_monitor = asyncio.get_event_loop().create_task(monitor_loop_lag(self.loop_lag))
+
+        items = 0
+        start = time.perf_counter()
+        for i, record in enumerate(records):
+            # The schedule is fixed up front, so time spent waiting behind a slow handler counts as latency.
+            scheduled = start + i / self.rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.ingest_lag.observe(max(0.0, -delay))
+
+            item = self.build_item(record)
+            _ingested.set(scheduled)
+            try:
+                await getattr(self.bot, f"handle_{record['source']}")(item)
+            except Exception as e:
+                print(f"Error handling {item}: {e}")
+            items += 1
+        fed = time.perf_counter()
+
+        deadline = fed + drain_timeout
+        idle = 0
+        while idle < 5 and time.perf_counter() < deadline:
+            idle = 0 if self.busy() else idle + 1
+            await asyncio.sleep(0.1)
+        drained = time.perf_counter()
+
+        lag_monitor.cancel()
+        await self.bot.close()
+
+        return self.report(items, fed - start, drained - start)
+
+    def report(self, items: int, feed_time: float, total_time: float) -> Dict[str, Any]:
+        def summary(histogram: Histogram) -> Dict[str, float]:
+            quantiles = histogram.quantiles()
+            return {
+                "count": histogram.count,
+                "mean_ms": histogram.total / histogram.count * 1000 if histogram.count else 0.0,
+                **{f"p{int(q * 100)}_ms": v * 1000 for q, v in quantiles.items()},
+                "max_ms": histogram.max * 1000
+            }
+
+        return {
+            "items": items,
+            "target_rate": self.rate,
+            "ingest_rate": items / feed_time if feed_time else 0.0,
+            "messages_sent": self.sent,
+            "send_rate": self.sent / total_time if total_time else 0.0,
+            "reactions": self.reacted,
+            "reaction_errors": self.reaction_errors,
+            "duration": total_time,
+            "end_to_end_latency": summary(self.latency),
+            "ingest_lag": summary(self.ingest_lag),
+            "event_loop_lag": summary(self.loop_lag),
+            "reddit_requests": self.reddit.requests,
+            "discord_calls": self.discord_calls,
+            "firestore_commits": self.firestore.commits,
+            "firestore_documents": len(self.firestore.documents),
+            "spans": metrics.snapshot()
+        }
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"Items: {report['items']} at {report['ingest_rate']:.1f}/s (target {report['target_rate']:.1f}/s), "
+          f"{report['messages_sent']} messages at {report['send_rate']:.1f}/s, {report['reactions']} reactions "
+          f"({report['reaction_errors']} failed) in {report['duration']:.1f}s")
+    print(f"Reddit requests: {report['reddit_requests']}, Discord calls: {report['discord_calls']}, "
+          f"Firestore commits: {report['firestore_commits']} ({report['firestore_documents']} documents)")
+
+    print(f"\n{'':<22}{'n':>8}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    rows = [(name, report[key]) for name, key in (("ingest -> send", "end_to_end_latency"),
+                                                   ("ingest lag", "ingest_lag"),
+                                                   ("event loop lag", "event_loop_lag"))]
+    for name, span in report["spans"].items():
+        rows.append((name, {"count": span["count"],
+                            **{f"{k}_ms": span[k] * 1000 for k in ("mean", "p50", "p95", "p99", "max")}}))
+    for name, s in rows:
+        print(f"{name[:21]:<22}{s['count']:>8}{s['mean_ms']:>9.1f}{s['p50_ms']:>9.1f}{s['p95_ms']:>9.1f}"
+              f"{s['p99_ms']:>9.1f}{s['max_ms']:>9.1f}")
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(
+        description="Replay a stream of Reddit items through the bot's handlers against local fakes of Reddit, "
+                    "Discord and Firestore, and report throughput and latency.")
+    parser.add_argument("--replay", help="JSON lines file of recorded items to replay instead of a synthetic stream.")
+    parser.add_argument("--record", help="Write the replayed stream to this JSON lines file.")
+    parser.add_argument("--items", type=int, default=2000, help="Number of synthetic items.")
+    parser.add_argument("--rate", type=float, default=20.0, help="Items fed to the handlers per second.")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help=f"Weights of the synthetic streams, defaults to {DEFAULT_MIX}.")
+    parser.add_argument("--repost-rate", type=float, default=0.05, help="Share of comments by RepostSleuthBot.")
+    parser.add_argument("--dirty-rate", type=float, default=0.05, help="Share of bodies containing a listed word.")
+    parser.add_argument("--reaction-rate", type=float, default=0.1, help="Share of posted items a mod reacts to.")
+    parser.add_argument("--reaction-delay", type=float, default=1.0, help="Seconds before the mod reacts.")
+    parser.add_argument("--reddit-latency", type=float, default=0.05, help="Mean Reddit request latency in seconds.")
+    parser.add_argument("--discord-latency", type=float, default=0.05, help="Mean Discord call latency in seconds.")
+    parser.add_argument("--firestore-latency", type=float, default=0.05, help="Firestore commit latency in seconds.")
+    parser.add_argument("--discord-rate", type=int,
+                        help="Messages per channel per 5 seconds, defaults to the dispatcher's limit.")
+    parser.add_argument("--scanner-mode", choices=("process", "thread", "inline"), default="process")
+    parser.add_argument("--subreddit", default="gtaonline")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+    args = parser.parse_args(argv)
+    if isinstance(args.mix, str):
+        args.mix = parse_mix(args.mix)
+
+    if args.replay:
+        records = list(read_stream(args.replay))
+    else:
+        records = list(synthetic_stream(args.items, args.mix, args.subreddit, args.repost_rate, args.dirty_rate,
+                                        args.seed))
+    if args.record:
+        with open(args.record, "w", encoding="utf8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+
+    random.seed(args.seed)
+    workdir = tempfile.mkdtemp(prefix="lcb-loadtest-")
+
+    async def run():
+        load_test = LoadTest(workdir, args.rate, args.subreddit, args.reddit_latency, args.discord_latency,
+                             args.firestore_latency, args.reaction_rate, args.reaction_delay, args.discord_rate,
+                             args.scanner_mode)
+        return await load_test.run(records)
+
+    try:
+        # The bot prints as it runs, which would end up in the middle of the JSON report.
+        with contextlib.redirect_stdout(sys.stderr if args.json else sys.stdout):
+            report = asyncio.get_event_loop().run_until_complete(run())
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,34 @@
-import pickle
-import re
-from typing import Any, Dict, Generator, Iterable
+import argparse
+import csv
+import json
+import os
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from functools import partial
+from typing import Any, Dict, Generator, Iterable, Iterator, List, Optional, Tuple
 
 from config import config
+from helpers.action_log import (ACTION_KINDS, ActionLog, action_kinds, get_action_kinds, get_item_type,
+                                get_subreddit, get_timestamp, read_pickle_payloads)
 
-POST_URL_PATTERN = re.compile(
-    r"/r(?:/(?P<subreddit>\w+))/comments(?:/(?P<submission>\w+))(?:/\w+/(?P<comment>\w+))?")
 
+def get_action_log() -> ActionLog:
+    return ActionLog(config.get("actions_log", "actions"))
 
-def get_payloads() -> Generator[Any, None, None]:
-    with open(config["payloads_file"], "rb") as f:
-        while True:
-            try:
-                yield pickle.load(f)
-            except EOFError:
-                break
+
+def get_payloads(**filters) -> Generator[Any, None, None]:
+    action_log = get_action_log()
+    if not action_log.exists() and not filters and os.path.exists(config["payloads_file"]):
+        yield from read_pickle_payloads(config["payloads_file"])
+    else:
+        yield from action_log.payloads(**filters)
 
 
 def get_actions_by_user(user: str = "") -> Dict:
+    if user:
+        return split_actions_by_user(get_payloads(moderator=user), user)
     return split_actions_by_user(get_payloads(), user)
 
 
@@ -49,24 +60,151 @@ def split_actions_by_type(payloads: Iterable[Dict[str, Any]]) -> Dict:
     }
 
     for payload in payloads:
-        if isinstance(payload["item"], str):
-            match = POST_URL_PATTERN.search(payload["item"])
-            if match and match.group("comment"):
-                types["comments"].append(payload)
-            elif match:
-                types["submissions"].append(payload)
-        else:
-            if payload["item"]["type"] in ("submission", "comment"):
-                types[f"{payload['item']['type']}s"].append(payload)
+        item_type = get_item_type(payload)
+        if item_type in ("submission", "comment"):
+            types[f"{item_type}s"].append(payload)
 
     return types
 
 
-if __name__ == "__main__":
-    payloads = [p for p in get_payloads()]
+class ActionSummary:
+
+    def __init__(self):
+        self.total = 0
+        self.types = Counter()
+        self.moderators: Dict[str, Counter] = dict()
+        self.days: Dict[str, Counter] = dict()
+        self.subreddits = Counter()
+        self.actions = Counter()
+
+    def add(self, item_type: str, moderator: str, timestamp: float, subreddit: str, kinds: Iterable[str]):
+        item_type = item_type or "unknown"
+        day = datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%d") if timestamp else "unknown"
+
+        self.total += 1
+        self.types[item_type] += 1
+        self.moderators.setdefault(moderator, Counter())[item_type] += 1
+        self.days.setdefault(day, Counter())[item_type] += 1
+        self.subreddits[subreddit or "unknown"] += 1
+        self.actions.update(kinds)
+
+    def merge(self, other: 'ActionSummary') -> 'ActionSummary':
+        self.total += other.total
+        self.types.update(other.types)
+        for moderator, counts in other.moderators.items():
+            self.moderators.setdefault(moderator, Counter()).update(counts)
+        for day, counts in other.days.items():
+            self.days.setdefault(day, Counter()).update(counts)
+        self.subreddits.update(other.subreddits)
+        self.actions.update(other.actions)
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "total": self.total,
+            "types": dict(self.types.most_common()),
+            "moderators": {moderator: dict(counts) for moderator, counts in
+                           sorted(self.moderators.items(), key=lambda m: -sum(m[1].values()))},
+            "days": {day: dict(counts) for day, counts in sorted(self.days.items())},
+            "subreddits": dict(self.subreddits.most_common()),
+            "actions": dict(self.actions.most_common())
+        }
+
+    def rows(self) -> Iterator[Tuple[str, str, str, int]]:
+        yield "total", "", "", self.total
+        for item_type, count in self.types.most_common():
+            yield "type", item_type, "", count
+        for moderator, counts in sorted(self.moderators.items()):
+            for item_type, count in sorted(counts.items()):
+                yield "moderator", moderator, item_type, count
+        for day, counts in sorted(self.days.items()):
+            for item_type, count in sorted(counts.items()):
+                yield "day", day, item_type, count
+        for subreddit, count in self.subreddits.most_common():
+            yield "subreddit", subreddit, "", count
+        for kind, count in self.actions.most_common():
+            yield "action", kind, "", count
+
+
+def summarize_log(path: str, segment: Optional[int] = None, **filters) -> ActionSummary:
+    summary = ActionSummary()
+    # Everything that's counted is in the index, so the records themselves are never read.
+    with ActionLog(path) as action_log:
+        for entry in action_log.entries(segment=segment, **filters):
+            summary.add(entry.item_type, entry.moderator, entry.timestamp, entry.subreddit, action_kinds(entry.actions))
+    return summary
+
+
+def summarize_pickle(path: str, action: Optional[str] = None, start: Optional[float] = None,
+                     end: Optional[float] = None, moderator: Optional[str] = None,
+                     item_type: Optional[str] = None, subreddit: Optional[str] = None) -> ActionSummary:
+    summary = ActionSummary()
+    for payload in read_pickle_payloads(path):
+        timestamp, t, kinds = get_timestamp(payload), get_item_type(payload), get_action_kinds(payload)
+        sub = get_subreddit(payload)
+        if start is not None and timestamp < start or end is not None and timestamp >= end:
+            continue
+        if moderator is not None and payload.get("user") != moderator:
+            continue
+        if item_type is not None and t != item_type or action is not None and action not in kinds:
+            continue
+        if subreddit is not None and sub != subreddit:
+            continue
+        summary.add(t, str(payload.get("user", "")), timestamp, sub, kinds)
+    return summary
+
+
+def summarize(processes: int = 1, **filters) -> ActionSummary:
+    action_log = get_action_log()
+    if not action_log.exists() and os.path.exists(config["payloads_file"]):
+        return summarize_pickle(config["payloads_file"], **filters)
+
+    segments = action_log.segments()
+    if processes <= 1 or len(segments) <= 1:
+        return summarize_log(action_log.path, **filters)
+
+    # Segments are independent, so each worker streams its own and only the counters come back.
+    summary = ActionSummary()
+    with ProcessPoolExecutor(min(processes, len(segments))) as executor:
+        for result in executor.map(partial(summarize_log, action_log.path, **filters), segments):
+            summary.merge(result)
+    return summary
+
+
+def _parse_date(value: str) -> float:
+    return datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp()
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Summarize the mod actions taken through the bot.")
+    parser.add_argument("--moderator", help="Only count actions by this moderator.")
+    parser.add_argument("--since", type=_parse_date, help="Only count actions on or after this date (YYYY-MM-DD).")
+    parser.add_argument("--until", type=_parse_date, help="Only count actions before this date (YYYY-MM-DD).")
+    parser.add_argument("--subreddit", help="Only count actions on items in this subreddit.")
+    parser.add_argument("--action", choices=ACTION_KINDS, help="Only count actions of this kind.")
+    parser.add_argument("--type", dest="item_type", choices=("submission", "comment", "modmail", "mod action"),
+                        help="Only count actions on this type of item.")
+    parser.add_argument("--processes", type=int, default=1, help="Spread the log's segments across processes.")
+    parser.add_argument("--format", choices=("json", "csv"), default="json")
+    parser.add_argument("--output", help="Write to this file instead of stdout.")
+    args = parser.parse_args(argv)
+
+    summary = summarize(args.processes, moderator=args.moderator, start=args.since, end=args.until,
+                        action=args.action, item_type=args.item_type, subreddit=args.subreddit)
+
+    out = open(args.output, "w", encoding="utf8", newline="") if args.output else sys.stdout
+    try:
+        if args.format == "csv":
+            writer = csv.writer(out)
+            writer.writerow(("section", "key", "type", "count"))
+            writer.writerows(summary.rows())
+        else:
+            json.dump(summary.to_dict(), out, indent=2)
+            out.write("\n")
+    finally:
+        if args.output:
+            out.close()
 
-    for t, payloads in split_actions_by_type(payloads).items():
-        actions_by_users = split_actions_by_user(payloads)
-        print(t, get_users_action_count(actions_by_users))
 
-    print(get_users_action_count(split_actions_by_user(payloads)))
+if __name__ == "__main__":
+    main()